@@ -1,9 +1,12 @@
 # app/auth.py
 from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.security import HTTPAuthorizationCredentials
-from datetime import datetime, timedelta
-from app.models import UserCreate, UserLogin, UserInDB, Token
-from app.utils import get_password_hash, verify_password, create_access_token, get_current_user, send_email
+from datetime import datetime
+from app.models import UserCreate, UserLogin, UserInDB, Token, RefreshRequest
+from app.utils import get_current_user, is_account_active
+from app.passwords import password_hasher
+from app.tokens import open_session, rotate_refresh_token, revoke_refresh_token
+from app.outbox import enqueue_email
 from app.database import db
 import uuid
 
@@ -17,7 +20,7 @@ async def register(user_data: UserCreate):
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     user_dict = user_data.dict()
     user_dict.update({
         "id": str(uuid.uuid4()),
@@ -27,18 +30,35 @@ async def register(user_data: UserCreate):
     })
 
     await db.users.insert_one(user_dict)
-    send_email(user_data.email, "Bienvenue sur EngineRent Pro", f"Bonjour {user_data.name}, votre compte a été créé !")
+    await enqueue_email(user_data.email, "Bienvenue sur EngineRent Pro", f"Bonjour {user_data.name}, votre compte a été créé !")
     user_dict.pop("password")
     return User(**user_dict)
 
 @router.post("/login", response_model=Token)
 async def login(user_data: UserLogin):
     user = await db.users.find_one({"email": user_data.email})
-    if not user or not verify_password(user_data.password, user["password"]):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    valid, new_hash = await password_hasher.verify_and_update(user_data.password, user["password"])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if not is_account_active(user):
+        raise HTTPException(status_code=403, detail="Compte désactivé ou en attente d'activation")
+    if new_hash:
+        # Coût bcrypt modifié : le hash est remplacé tant qu'on dispose du mot de passe en clair
+        await db.users.update_one({"id": user["id"], "password": user["password"]}, {"$set": {"password": new_hash}})
+
+    return await open_session(user["id"])
+
+@router.post("/refresh", response_model=Token)
+async def refresh(body: RefreshRequest):
+    # Rotation : l'ancien jeton de rafraîchissement devient inutilisable
+    return await rotate_refresh_token(body.refresh_token)
 
-    access_token = create_access_token({"sub": user["id"]}, timedelta(minutes=60))
-    return {"access_token": access_token, "token_type": "bearer"}
+@router.post("/logout")
+async def logout(body: RefreshRequest):
+    await revoke_refresh_token(body.refresh_token)
+    return {"message": "Session fermée"}
 
 @router.get("/me", response_model=User)
 async def get_me(current_user: User = Depends(get_current_user)):
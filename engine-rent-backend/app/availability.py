@@ -0,0 +1,251 @@
+# app/availability.py
+# Disponibilité des engins sur une période, à partir des intervalles de réservations actives
+# et des maintenances ouvertes
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import UpdateMany
+from pymongo.errors import BulkWriteError
+
+from app.database import db
+
+ACTIVE_RESERVATION_STATUSES = ["pending", "approved", "paid"]
+OPEN_MAINTENANCE_STATUSES = ["scheduled", "in_progress"]
+MAINTENANCE_PROJECTION = {"_id": 0, "id": 1, "engine_id": 1, "scheduled_date": 1, "scheduled_end": 1, "duration_days": 1}
+
+
+def overlap_query(start: datetime, end: datetime, engine_id: Optional[str] = None) -> dict:
+    # Réservations actives qui chevauchent [start, end) : start < autre.end ET end > autre.start
+    query = {
+        "status": {"$in": ACTIVE_RESERVATION_STATUSES},
+        "start_date": {"$lt": end},
+        "end_date": {"$gt": start},
+    }
+    if engine_id is not None:
+        query = {"engine_id": engine_id, **query}
+    return query
+
+
+async def exclude_busy_engines(query: dict, available_from: Optional[datetime], available_to: Optional[datetime]) -> bool:
+    # Ajoute au filtre catalogue l'exclusion des engins réservés sur la période ; False si aucune période
+    if available_from is None and available_to is None:
+        return False
+    if available_from is None or available_to is None or available_from >= available_to:
+        raise HTTPException(status_code=400, detail="Invalid availability period")
+    query.setdefault("id", {})["$nin"] = await busy_engine_ids(available_from, available_to)
+    return True
+
+
+def maintenance_slot_owner(maintenance_id: str) -> str:
+    # Les jours d'une maintenance sont réservés dans reservation_slots sous cet identifiant
+    return f"maintenance:{maintenance_id}"
+
+
+def maintenance_period(maintenance: dict) -> Tuple[datetime, datetime]:
+    # Sans date de fin (maintenance créée à la main), même règle que le planificateur :
+    # duration_days jours, un par défaut
+    start = maintenance["scheduled_date"]
+    end = maintenance.get("scheduled_end") or start + timedelta(days=max(int(maintenance.get("duration_days") or 1), 1))
+    return start, end
+
+
+async def busy_engine_ids(start: datetime, end: datetime) -> List[str]:
+    # Un seul passage côté serveur, couvert par l'index (status, start_date, end_date, engine_id)
+    busy = set(await db.reservations.distinct("engine_id", overlap_query(start, end)))
+    # Maintenances ouvertes qui chevauchent la période (index status, scheduled_date) : peu nombreuses,
+    # la fin éventuellement implicite est calculée ici
+    async for maintenance in db.maintenances.find(
+        {"status": {"$in": OPEN_MAINTENANCE_STATUSES}, "scheduled_date": {"$lt": end}}, MAINTENANCE_PROJECTION
+    ):
+        if maintenance_period(maintenance)[1] > start:
+            busy.add(maintenance["engine_id"])
+    return list(busy)
+
+
+async def migrate_reservation_engine_ids() -> dict:
+    # Les anciennes réservations (et leurs slots) référencent l'engin par son _id Mongo en hexadécimal ;
+    # la clé commune est l'id public de l'engin, celui envoyé par le frontend
+    legacy = {}
+    async for engine in db.engines.find({}, {"_id": 1, "id": 1}):
+        if engine.get("id") and str(engine["_id"]) != engine["id"]:
+            legacy[str(engine["_id"])] = engine["id"]
+    used = await db.reservations.distinct("engine_id", {"engine_id": {"$in": list(legacy)}})
+    if not used:
+        return {"engines": 0, "reservations": 0, "slots": 0, "slot_conflicts": 0}
+
+    writes = [UpdateMany({"engine_id": old}, {"$set": {"engine_id": legacy[old]}}) for old in used]
+    reservations = await db.reservations.bulk_write(writes, ordered=False)
+    slot_conflicts = 0
+    try:
+        slots = (await db.reservation_slots.bulk_write(writes, ordered=False)).modified_count
+    except BulkWriteError as exc:
+        # Un même jour déjà pris sous les deux clés : double réservation existante, à traiter à la main
+        slots = exc.details.get("nModified", 0)
+        slot_conflicts = len(exc.details.get("writeErrors", []))
+    # Les calendriers concernés sont reconstruits à la prochaine lecture
+    await db.engine_calendars.delete_many({"engine_id": {"$in": [legacy[old] for old in used]}})
+    return {
+        "engines": len(used),
+        "reservations": reservations.modified_count,
+        "slots": slots,
+        "slot_conflicts": slot_conflicts,
+    }
+
+
+# -------------------------------------
+# 📅 CALENDRIER MATÉRIALISÉ PAR ENGIN
+# -------------------------------------
+# Un document par engin dans engine_calendars, avec les intervalles des réservations
+# qui bloquent des jours. Mis à jour à chaque création / approbation / rejet / paiement,
+# il évite de relire tout l'historique de réservations à chaque affichage du calendrier.
+# Les maintenances ouvertes n'y sont pas stockées : elles sont relues à chaque affichage
+# (maintenance_intervals), si bien qu'une replanification ou une clôture est visible aussitôt.
+
+CALENDAR_STATUSES = ["pending", "approved", "paid"]
+DAY_FREE, DAY_PENDING, DAY_CONFIRMED, DAY_MAINTENANCE = "0", "1", "2", "3"
+DAY_STATUSES = {DAY_PENDING: "pending", DAY_CONFIRMED: "confirmed", DAY_MAINTENANCE: "maintenance"}
+REBUILD_CATCH_UP = timedelta(minutes=1)  # réservations créées récemment relues après reconstruction
+
+
+def _calendar_interval(reservation: dict) -> dict:
+    return {
+        "reservation_id": reservation["id"],
+        "start": reservation["start_date"],
+        "end": reservation["end_date"],
+        "status": reservation["status"],
+    }
+
+
+async def calendar_prune(engine_id: str):
+    # Intervalles terminés retirés : sans effet (ni écriture) si le calendrier n'en contient pas
+    now = datetime.utcnow()
+    await db.engine_calendars.update_one(
+        {"engine_id": engine_id, "intervals.end": {"$lt": now}},
+        {"$pull": {"intervals": {"end": {"$lt": now}}}}
+    )
+
+
+async def calendar_add(reservation: dict):
+    await calendar_prune(reservation["engine_id"])
+    await db.engine_calendars.update_one(
+        {"engine_id": reservation["engine_id"]},
+        {"$addToSet": {"intervals": _calendar_interval(reservation)}},
+        upsert=True
+    )
+
+
+async def calendar_set_status(reservation_id: str, status: str):
+    if status not in CALENDAR_STATUSES:
+        await calendar_remove(reservation_id)
+        return
+    await db.engine_calendars.update_one(
+        {"intervals.reservation_id": reservation_id},
+        {"$set": {"intervals.$[booking].status": status}},
+        array_filters=[{"booking.reservation_id": reservation_id}]
+    )
+
+
+async def calendar_remove(reservation_id: str):
+    # Profite de l'écriture pour purger les intervalles terminés : le document reste borné
+    await db.engine_calendars.update_one(
+        {"intervals.reservation_id": reservation_id},
+        {"$pull": {"intervals": {"$or": [
+            {"reservation_id": reservation_id},
+            {"end": {"$lt": datetime.utcnow()}},
+        ]}}}
+    )
+
+
+async def calendar_set_status_many(reservation_ids: List[str], status: str):
+    await db.engine_calendars.update_many(
+        {"intervals.reservation_id": {"$in": reservation_ids}},
+        {"$set": {"intervals.$[booking].status": status}},
+        array_filters=[{"booking.reservation_id": {"$in": reservation_ids}}]
+    )
+
+
+async def calendar_remove_many(reservation_ids: List[str]):
+    await db.engine_calendars.update_many(
+        {"intervals.reservation_id": {"$in": reservation_ids}},
+        {"$pull": {"intervals": {"reservation_id": {"$in": reservation_ids}}}}
+    )
+
+
+async def rebuild_calendar(engine_id: str) -> dict:
+    # Construction initiale (ou reprise) depuis les réservations encore à venir : le tableau est
+    # remplacé, ce qui élimine doublons, statuts périmés et intervalles terminés
+    now = datetime.utcnow()
+    query = {"engine_id": engine_id, "status": {"$in": CALENDAR_STATUSES}, "end_date": {"$gt": now}}
+    projection = {"_id": 0, "id": 1, "start_date": 1, "end_date": 1, "status": 1}
+    reservations = await db.reservations.find(query, projection).to_list(None)
+    await db.engine_calendars.update_one(
+        {"engine_id": engine_id},
+        {"$set": {"intervals": [_calendar_interval(r) for r in reservations], "built_at": now}},
+        upsert=True
+    )
+    # Rattrapage : une réservation insérée entre la lecture et l'écriture a pu voir son ajout
+    # incrémental écrasé par le $set
+    late = await db.reservations.find(
+        {**query, "created_at": {"$gte": now - REBUILD_CATCH_UP}, "id": {"$nin": [r["id"] for r in reservations]}},
+        projection
+    ).to_list(None)
+    if late:
+        await db.engine_calendars.update_one(
+            {"engine_id": engine_id},
+            {"$addToSet": {"intervals": {"$each": [_calendar_interval(r) for r in late]}}}
+        )
+    return await db.engine_calendars.find_one({"engine_id": engine_id})
+
+
+async def maintenance_intervals(engine_id: str) -> List[dict]:
+    # Maintenances ouvertes de l'engin au format des intervalles du calendrier (index engine_id, status)
+    now = datetime.utcnow()
+    intervals = []
+    async for maintenance in db.maintenances.find(
+        {"engine_id": engine_id, "status": {"$in": OPEN_MAINTENANCE_STATUSES}, "scheduled_date": {"$type": "date"}},
+        MAINTENANCE_PROJECTION
+    ):
+        start, end = maintenance_period(maintenance)
+        if end > now:
+            intervals.append({
+                "reservation_id": maintenance_slot_owner(maintenance["id"]), "start": start, "end": end, "status": "maintenance",
+            })
+    return intervals
+
+
+def _day_code(status: str) -> str:
+    if status == "maintenance":
+        return DAY_MAINTENANCE
+    return DAY_PENDING if status == "pending" else DAY_CONFIRMED
+
+
+def render_calendar(intervals: List[dict], start: datetime, end: datetime) -> dict:
+    # Bitmap d'un caractère par jour ("0" libre, "1" en attente, "2" confirmé, "3" en maintenance)
+    # + intervalles fusionnés
+    n_days = (end - start).days
+    days = [DAY_FREE] * n_days
+    for interval in intervals:
+        code = _day_code(interval["status"])
+        first = max(0, (interval["start"] - start).days)
+        last = min(n_days, -((start - interval["end"]) // timedelta(days=1)))  # jour de fin exclu, arrondi au-dessus
+        for i in range(first, last):
+            if days[i] < code:
+                days[i] = code
+
+    booked = []
+    i = 0
+    while i < n_days:
+        if days[i] == DAY_FREE:
+            i += 1
+            continue
+        j = i
+        while j < n_days and days[j] == days[i]:
+            j += 1
+        booked.append({
+            "start": start + timedelta(days=i),
+            "end": start + timedelta(days=j),
+            "status": DAY_STATUSES[days[i]],
+        })
+        i = j
+    return {"from": start, "to": end, "days": "".join(days), "booked": booked}
@@ -0,0 +1,64 @@
+# app/booking.py
+# Réservation atomique d'un engin : chaque jour occupé est un "slot" protégé par un index unique
+from datetime import datetime, timedelta
+from typing import List
+
+from pymongo.errors import BulkWriteError
+
+from app.availability import overlap_query
+from app.database import db
+
+DUPLICATE_KEY = 11000
+
+
+class BookingConflict(Exception):
+    pass
+
+
+def slot_days(start: datetime, end: datetime) -> List[datetime]:
+    # Jours (à minuit) touchés par l'intervalle [start, end)
+    day = datetime(start.year, start.month, start.day)
+    days = []
+    while day < end:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+async def claim_slots(engine_id: str, reservation_id: str, start: datetime, end: datetime):
+    # L'index unique (engine_id, day) garantit qu'un seul appel concurrent obtient chaque jour
+    slots = [
+        {"engine_id": engine_id, "day": day, "reservation_id": reservation_id}
+        for day in slot_days(start, end)
+    ]
+    try:
+        await db.reservation_slots.insert_many(slots, ordered=True)
+    except BulkWriteError as exc:
+        await release_slots(reservation_id)
+        if all(error.get("code") == DUPLICATE_KEY for error in exc.details.get("writeErrors", [])):
+            raise BookingConflict()
+        raise
+
+
+async def release_slots(reservation_id: str):
+    await db.reservation_slots.delete_many({"reservation_id": reservation_id})
+
+
+async def book_reservation(reservation: dict) -> dict:
+    engine_id, reservation_id = reservation["engine_id"], reservation["id"]
+    start, end = reservation["start_date"], reservation["end_date"]
+
+    await claim_slots(engine_id, reservation_id, start, end)
+    try:
+        # Les réservations antérieures aux slots restent vérifiées par le prédicat de chevauchement
+        if await db.reservations.find_one(overlap_query(start, end, engine_id), {"_id": 1}):
+            raise BookingConflict()
+        await db.reservations.insert_one(reservation)
+    except BaseException:
+        await release_slots(reservation_id)
+        raise
+    return reservation
+
+
+async def release_slots_many(reservation_ids: List[str]):
+    await db.reservation_slots.delete_many({"reservation_id": {"$in": reservation_ids}})
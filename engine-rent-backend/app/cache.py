@@ -0,0 +1,214 @@
+# app/cache.py
+# Cache mémoire (LRU + TTL) des réponses JSON du catalogue, avec ETag et invalidation ciblée,
+# et des utilisateurs authentifiés (get_current_user) ; instantanés "stale-while-revalidate"
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+ENGINE_CACHE_SIZE = 2048
+ENGINE_CACHE_TTL = 60  # secondes : borne la péremption quand un autre worker écrit
+FACET_CACHE_SIZE = 512
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))  # 0 : cache désactivé
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    engine_ids: FrozenSet[str] = frozenset()
+    filters: Optional[dict] = None  # None pour une fiche engin, filtres pour une liste
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        expires_at, entry = item
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: Any, generation: Optional[int] = None):
+        # Une lecture commencée avant une invalidation ne doit pas réinsérer une valeur périmée
+        if generation is not None and generation != self.generation:
+            return
+        if self.ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, entry)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: str):
+        self.generation += 1
+        self._entries.pop(key, None)
+
+    def discard(self, predicate: Callable[[str, Any], bool]):
+        self.generation += 1
+        for key in [k for k, (_, entry) in self._entries.items() if predicate(k, entry)]:
+            del self._entries[key]
+
+    def clear(self):
+        self.generation += 1
+        self._entries.clear()
+
+
+engine_cache = TTLCache(maxsize=ENGINE_CACHE_SIZE, ttl=ENGINE_CACHE_TTL)
+facet_cache = TTLCache(maxsize=FACET_CACHE_SIZE, ttl=ENGINE_CACHE_TTL)
+# Borné par le TTL : un changement fait par un autre worker (rôle, suppression) est vu après USER_CACHE_TTL
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+# -------------------------------------
+# 🔑 CLÉS & SÉRIALISATION
+# -------------------------------------
+
+def engine_key(engine_id: str) -> str:
+    return f"engine:{engine_id}"
+
+
+def facets_key(filters: dict, search: Optional[str]) -> str:
+    return "facets:" + json.dumps({"filters": filters, "search": search}, sort_keys=True, default=str)
+
+
+def listing_key(filters: dict, limit: int) -> str:
+    return "engines:" + json.dumps({"filters": filters, "limit": limit}, sort_keys=True, default=str)
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def engine_entry(engine: BaseModel) -> CachedResponse:
+    body = engine.model_dump_json().encode()
+    return CachedResponse(body=body, etag=make_etag(body), engine_ids=frozenset([engine.id]))
+
+
+def listing_entry(filters: dict, engines: List[BaseModel], headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+    body = b"[" + b",".join(engine.model_dump_json().encode() for engine in engines) + b"]"
+    return CachedResponse(
+        body=body,
+        etag=make_etag(body),
+        headers=headers or {},
+        engine_ids=frozenset(engine.id for engine in engines),
+        filters=dict(filters),
+    )
+
+
+def json_entry(payload: dict) -> CachedResponse:
+    body = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return CachedResponse(body=body, etag=make_etag(body))
+
+
+def cached_response(request: Request, entry: CachedResponse) -> Response:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or entry.etag in tags:
+            return Response(status_code=304, headers={"ETag": entry.etag})
+    return Response(
+        content=entry.body,
+        media_type="application/json",
+        headers={"ETag": entry.etag, **entry.headers},
+    )
+
+
+# -------------------------------------
+# ♻️ INVALIDATION
+# -------------------------------------
+
+def _matches(filters: dict, doc: dict) -> bool:
+    # Un champ absent du document (mise à jour partielle) est considéré comme pouvant correspondre
+    return all(field not in doc or doc[field] == value for field, value in filters.items())
+
+
+def invalidate_engine(engine_id: str, docs: Iterable[dict] = ()):
+    # docs : états connus de l'engin (avant/après écriture, ou champs modifiés)
+    docs = [doc for doc in docs if doc]
+    # Toute écriture sur un engin peut changer les compteurs : les facettes sont recalculées
+    facet_cache.clear()
+    engine_cache.pop(engine_key(engine_id))
+    engine_cache.discard(
+        lambda key, entry: entry.filters is not None
+        and (engine_id in entry.engine_ids or any(_matches(entry.filters, doc) for doc in docs))
+    )
+
+
+def clear_catalog_caches():
+    engine_cache.clear()
+    facet_cache.clear()
+
+
+def invalidate_user(user_id: Optional[str]):
+    if user_id:
+        user_cache.pop(user_id)
+
+
+# -------------------------------------
+# ⏳ STALE-WHILE-REVALIDATE
+# -------------------------------------
+
+class StaleWhileRevalidate:
+    # Valeur unique recalculée en arrière-plan : au-delà de fresh_seconds, la valeur en cache est
+    # servie pendant qu'un seul recalcul tourne ; seul le tout premier appel (ou une valeur plus
+    # vieille que max_stale_seconds) attend le calcul, partagé par tous les appels concurrents
+    def __init__(self, compute: Callable[[], Awaitable[Any]], fresh_seconds: float, max_stale_seconds: float):
+        self.compute = compute
+        self.fresh_seconds = fresh_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self._value: Any = None
+        self._computed_at: Optional[float] = None
+        self._refreshing: Optional[asyncio.Task] = None
+
+    def _refresh(self) -> asyncio.Task:
+        if self._refreshing is None:
+            self._refreshing = asyncio.create_task(self._run())
+        return self._refreshing
+
+    async def _run(self):
+        try:
+            value = await self.compute()
+            self._value, self._computed_at = value, time.monotonic()
+            return value
+        finally:
+            self._refreshing = None
+
+    async def get(self) -> Any:
+        if self._computed_at is None:
+            return await asyncio.shield(self._refresh())
+        age = time.monotonic() - self._computed_at
+        if age > self.max_stale_seconds:
+            return await asyncio.shield(self._refresh())
+        if age > self.fresh_seconds:
+            self._refresh().add_done_callback(self._log_failure)
+        return self._value
+
+    def _log_failure(self, task: asyncio.Task):
+        # Échec d'un recalcul en arrière-plan : la valeur précédente reste servie, mais l'erreur est
+        # journalisée (sinon un tableau de bord figé ne laisse aucune trace)
+        if task.cancelled() or task.exception() is None:
+            return
+        age = time.monotonic() - self._computed_at if self._computed_at is not None else 0
+        print(f"🗄️ Recalcul en arrière-plan échoué ({task.exception()!r}), valeur servie âgée de {age:.0f}s")
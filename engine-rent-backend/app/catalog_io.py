@@ -0,0 +1,176 @@
+# app/catalog_io.py
+# Import / export en masse du catalogue d'engins (CSV ou NDJSON), en flux et par lots
+import csv
+import io
+import json
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Tuple, Union
+
+from pydantic import ValidationError
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.cache import clear_catalog_caches
+from app.database import db
+from app.models import EngineCreate
+from app.search import search_index
+
+IMPORT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+CSV_COLUMNS = [
+    "id", "name", "description", "category", "brand", "daily_rate", "status",
+    "location", "longitude", "latitude", "images", "specifications", "created_at", "external_ref",
+]
+FORMATS = ("csv", "ndjson")
+
+
+# -------------------------------------
+# 📥 LECTURE DES LIGNES
+# -------------------------------------
+
+def _csv_row_to_engine(row: Dict[str, str]) -> dict:
+    # Une ligne CSV plate -> document au format EngineCreate (+ id éventuel)
+    data = {key: value for key, value in row.items() if key and value not in (None, "")}
+    longitude, latitude = data.pop("longitude", None), data.pop("latitude", None)
+    if longitude is not None or latitude is not None:
+        data["geo"] = {"type": "Point", "coordinates": [float(longitude), float(latitude)]}
+    if "images" in data:
+        data["images"] = [image for image in data["images"].split("|") if image]
+    if "specifications" in data:
+        data["specifications"] = json.loads(data["specifications"])
+    return data
+
+
+def iter_rows(stream: io.TextIOBase, fmt: str) -> Iterator[Tuple[int, object]]:
+    # Produit (numéro de ligne, données brutes ou exception de parsing) sans charger le fichier
+    if fmt == "csv":
+        for row_number, row in enumerate(csv.DictReader(stream), start=2):
+            try:
+                yield row_number, _csv_row_to_engine(row)
+            except (TypeError, ValueError) as exc:
+                yield row_number, exc
+    elif fmt == "ndjson":
+        for row_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield row_number, json.loads(line)
+            except ValueError as exc:
+                yield row_number, exc
+    else:
+        raise ValueError(f"Format inconnu : {fmt}")
+
+
+# -------------------------------------
+# 🧮 IMPORT PAR LOTS
+# -------------------------------------
+
+def _write(row: dict, engine: EngineCreate, now: datetime) -> Union[InsertOne, UpdateOne]:
+    # Rapprochement uniquement sur une clé explicite : l'id de l'engin, ou la référence externe du
+    # partenaire (numéro de série...). Le nom n'est pas une clé : une flotte compte souvent plusieurs
+    # unités du même modèle, chaque ligne sans clé est donc un nouvel engin
+    fields = engine.model_dump(exclude_none=True)
+    engine_id, external_ref = row.get("id"), row.get("external_ref")
+    on_insert = {"status": "available", "created_at": now}
+    if engine_id:
+        return UpdateOne({"id": engine_id}, {"$set": fields, "$setOnInsert": on_insert}, upsert=True)
+    if external_ref:
+        on_insert["id"] = str(uuid.uuid4())
+        return UpdateOne({"external_ref": str(external_ref)}, {"$set": fields, "$setOnInsert": on_insert}, upsert=True)
+    return InsertOne({**fields, **on_insert, "id": str(uuid.uuid4())})
+
+
+async def _flush(operations: List[Union[InsertOne, UpdateOne]], row_numbers: List[int], report: dict):
+    if not operations:
+        return
+    try:
+        result = await db.engines.bulk_write(operations, ordered=False)
+        details = result.bulk_api_result
+    except BulkWriteError as exc:
+        details = exc.details
+        for error in details.get("writeErrors", []):
+            _report_error(report, row_numbers[error["index"]], error.get("errmsg", "Erreur d'écriture"))
+    report["inserted"] += details.get("nUpserted", 0) + details.get("nInserted", 0)
+    report["updated"] += details.get("nModified", 0)
+
+
+def _report_error(report: dict, row_number: int, error: object):
+    report["failed"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"row": row_number, "error": str(error)})
+
+
+async def import_engines(rows: Iterable[Tuple[int, object]], batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    report = {"processed": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": []}
+    operations: List[Union[InsertOne, UpdateOne]] = []
+    row_numbers: List[int] = []
+    now = datetime.utcnow()
+
+    for row_number, row in rows:
+        report["processed"] += 1
+        if isinstance(row, Exception):
+            _report_error(report, row_number, row)
+            continue
+        if not isinstance(row, dict):
+            _report_error(report, row_number, "Objet JSON attendu")
+            continue
+        try:
+            engine = EngineCreate(**row)
+        except ValidationError as exc:
+            _report_error(report, row_number, "; ".join(
+                f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in exc.errors()
+            ))
+            continue
+        operations.append(_write(row, engine, now))
+        row_numbers.append(row_number)
+        if len(operations) >= batch_size:
+            await _flush(operations, row_numbers, report)
+            operations, row_numbers = [], []
+
+    await _flush(operations, row_numbers, report)
+
+    # Le catalogue a pu changer en profondeur : on repart de zéro plutôt que d'invalider ligne par ligne
+    clear_catalog_caches()
+    search_index.invalidate()
+    await search_index.record_change()
+    return report
+
+
+# -------------------------------------
+# 📤 EXPORT EN FLUX
+# -------------------------------------
+
+def _csv_line(values: List[object]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue().encode()
+
+
+def _engine_to_csv(engine: dict) -> bytes:
+    geo = engine.get("geo") or {}
+    longitude, latitude = (geo.get("coordinates") or [None, None])[:2]
+    created_at = engine.get("created_at")
+    return _csv_line([
+        engine.get("id"), engine.get("name"), engine.get("description"), engine.get("category"),
+        engine.get("brand"), engine.get("daily_rate"), engine.get("status"), engine.get("location"),
+        longitude, latitude, "|".join(engine.get("images") or []),
+        json.dumps(engine.get("specifications") or {}, ensure_ascii=False),
+        created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+        engine.get("external_ref"),
+    ])
+
+
+async def export_engines(fmt: str) -> AsyncIterator[bytes]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu : {fmt}")
+    if fmt == "csv":
+        yield _csv_line(CSV_COLUMNS)
+    cursor = db.engines.find({}, {"_id": 0}).sort("id", 1).batch_size(EXPORT_BATCH_SIZE)
+    async for engine in cursor:
+        if fmt == "csv":
+            yield _engine_to_csv(engine)
+        else:
+            yield json.dumps(engine, default=str, ensure_ascii=False).encode() + b"\n"
@@ -1,38 +1,83 @@
 # app/dashboard.py
-from fastapi import APIRouter, Depends
+import asyncio
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException
 from app.utils import get_admin_user
 from app.database import db
+from app.revenue import revenue_between, revenue_overview, revenue_series
+from app.cache import StaleWhileRevalidate
+
+DASHBOARD_FRESH_SECONDS = 10
+DASHBOARD_MAX_STALE_SECONDS = 300
 
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
-@router.get("/stats")
-async def get_dashboard_stats(current_user = Depends(get_admin_user)):
-    total_engines = await db.engines.count_documents({})
-    available_engines = await db.engines.count_documents({"status": "available"})
-    rented_engines = await db.engines.count_documents({"status": "rented"})
-    maintenance_engines = await db.engines.count_documents({"status": "maintenance"})
+# Compteurs d'une collection en une seule agrégation : total + répartition par champ
+async def _collection_counts(collection, field: str) -> dict:
+    result = await collection.aggregate([{"$facet": {
+        "total": [{"$count": "count"}],
+        "by": [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}],
+    }}]).to_list(1)
+    facets = result[0] if result else {}
+    total = facets.get("total") or [{"count": 0}]
+    return {"total": total[0]["count"], **{str(row["_id"]): row["count"] for row in facets.get("by", [])}}
 
-    total_reservations = await db.reservations.count_documents({})
-    pending_reservations = await db.reservations.count_documents({"status": "pending"})
-    approved_reservations = await db.reservations.count_documents({"status": "approved"})
+async def compute_dashboard_snapshot() -> dict:
+    engines, reservations, users, revenue = await asyncio.gather(
+        _collection_counts(db.engines, "status"),
+        _collection_counts(db.reservations, "status"),
+        _collection_counts(db.users, "role"),
+        revenue_overview(),
+    )
+    return {
+        "engines": engines,
+        "reservations": reservations,
+        "users": users,
+        "revenue": revenue,
+        "computed_at": datetime.utcnow(),
+    }
 
-    completed_payments = await db.payments.find({"status": "completed"}).to_list(1000)
-    total_revenue = sum(p["amount"] for p in completed_payments)
+# Les onglets admin interrogent en boucle : un seul calcul à la fois, jamais d'attente sur MongoDB
+dashboard_snapshot = StaleWhileRevalidate(
+    compute_dashboard_snapshot,
+    fresh_seconds=DASHBOARD_FRESH_SECONDS,
+    max_stale_seconds=DASHBOARD_MAX_STALE_SECONDS,
+)
 
+@router.get("/stats")
+async def get_dashboard_stats(current_user = Depends(get_admin_user)):
+    snapshot = await dashboard_snapshot.get()
+    engines, reservations = snapshot["engines"], snapshot["reservations"]
     return {
         "engines": {
-            "total": total_engines,
-            "available": available_engines,
-            "rented": rented_engines,
-            "maintenance": maintenance_engines,
+            "total": engines["total"],
+            "available": engines.get("available", 0),
+            "rented": engines.get("rented", 0),
+            "maintenance": engines.get("maintenance", 0),
         },
         "reservations": {
-            "total": total_reservations,
-            "pending": pending_reservations,
-            "approved": approved_reservations,
+            "total": reservations["total"],
+            "pending": reservations.get("pending", 0),
+            "approved": reservations.get("approved", 0),
         },
-        "revenue": {
-            "total": total_revenue,
-            "this_month": total_revenue  # Simplified
-        }
+        "revenue": snapshot["revenue"],
+        "computed_at": snapshot["computed_at"]
+    }
+
+# Chiffre d'affaires d'une période [date_from, date_to) lu dans les agrégats jour / mois
+@router.get("/revenue")
+async def get_revenue(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    granularity: Literal["day", "month"] = "day",
+    current_user = Depends(get_admin_user)
+):
+    date_to = date_to or datetime.utcnow() + timedelta(days=1)
+    date_from = date_from or date_to - timedelta(days=31)
+    if date_from >= date_to:
+        raise HTTPException(status_code=400, detail="La date de fin doit être postérieure à la date de début")
+    return {
+        **await revenue_between(date_from, date_to),
+        "series": await revenue_series(date_from, date_to, granularity)
     }
@@ -1,6 +1,7 @@
 # app/database.py
 
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
 import os
 
 # Connexion à MongoDB
@@ -18,7 +19,70 @@ payments_collection        = db.payments           # Paiements (Stripe, etc.)
 maintenances_collection    = db.maintenances       # Interventions techniques
 support_tickets_collection = db.support_tickets    # Tickets de support
 feedbacks_collection       = db.feedbacks          # Avis clients (optionnel)
+reservation_slots_collection = db.reservation_slots  # Jours réservés par engin (anti double-réservation)
 
 # Collections supplémentaires
 categories_collection      = db.categories         # Types d'engins (grue, pelle, etc.)
 brands_collection          = db.brands             # Marques d'engins (Volvo, Caterpillar, etc.)
+
+
+# Index utilisés par l'API (pagination keyset, recherches de conflits, etc.)
+async def ensure_indexes():
+    for collection in (users_collection, engines_collection, reservations_collection,
+                       payments_collection, maintenances_collection, support_tickets_collection,
+                       feedbacks_collection):
+        await collection.create_index([("created_at", -1), ("id", -1)])
+    await reservations_collection.create_index([("user_id", 1), ("created_at", -1), ("id", -1)])
+    await reservations_collection.create_index([("status", 1), ("created_at", -1), ("id", -1)])
+    await reservations_collection.create_index([("status", 1), ("start_date", 1), ("end_date", 1), ("engine_id", 1)])
+    await reservations_collection.create_index([("engine_id", 1), ("status", 1), ("start_date", 1), ("end_date", 1)])
+    await support_tickets_collection.create_index([("user_id", 1), ("created_at", -1), ("id", -1)])
+    await payments_collection.create_index([("user_id", 1), ("created_at", -1), ("id", -1)])
+    await db.maintenance.create_index([("created_at", -1), ("id", -1)])
+    await db.maintenance.create_index([("technician_id", 1), ("created_at", -1), ("id", -1)])
+    await payments_collection.create_index([("reservation_id", 1), ("created_at", -1), ("id", -1)])
+    await payments_collection.create_index([("status", 1), ("created_at", 1), ("id", 1)])
+    await engines_collection.create_index([("geo", "2dsphere")])
+    await reservation_slots_collection.create_index([("engine_id", 1), ("day", 1)], unique=True)
+    await reservation_slots_collection.create_index("reservation_id")
+    await db.engine_calendars.create_index("engine_id", unique=True)
+    await db.engine_calendars.create_index("intervals.reservation_id")
+    await db.email_outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.email_outbox.create_index("claim")
+    await db.idempotency_keys.create_index([("user_id", 1), ("key", 1)], unique=True)
+    await db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
+    await db.refresh_tokens.create_index("jti", unique=True)
+    await db.refresh_tokens.create_index([("user_id", 1), ("expires_at", 1)])
+    await db.refresh_tokens.create_index("expires_at", expireAfterSeconds=0)
+    await db.revoked_tokens.create_index("jti", unique=True)
+    await db.revoked_tokens.create_index("revoked_at")
+    await db.revoked_tokens.create_index("expires_at", expireAfterSeconds=0)
+    await db.revenue_rollups.create_index([("granularity", 1), ("bucket", 1)], unique=True)
+    await reservations_collection.create_index("id")
+    await db.reconciliation_mismatches.create_index([("run_id", 1), ("reservation_id", 1), ("kind", 1)], unique=True)
+    await db.reconciliation_runs.create_index("id", unique=True)
+    await engines_collection.create_index("id")
+    await engines_collection.create_index("name")
+    await engines_collection.create_index(
+        "external_ref", unique=True, partialFilterExpression={"external_ref": {"$type": "string"}}
+    )
+    await maintenances_collection.create_index([("engine_id", 1), ("status", 1)])
+    await maintenances_collection.create_index([("technician_id", 1), ("status", 1)])
+    await maintenances_collection.create_index([("status", 1), ("scheduled_date", 1)])
+
+
+# Codes renvoyés par un serveur standalone qui ne supporte pas les transactions
+TRANSACTIONS_UNSUPPORTED = (20, 263)
+
+
+async def run_in_transaction(callback):
+    # Exécute callback(session) dans une transaction si le déploiement le permet (replica set),
+    # sinon directement avec session=None : la première écriture échoue avant tout effet
+    async with await client.start_session() as session:
+        try:
+            async with session.start_transaction():
+                return await callback(session)
+        except OperationFailure as exc:
+            if exc.code not in TRANSACTIONS_UNSUPPORTED:
+                raise
+    return await callback(None)
@@ -1,21 +1,38 @@
 # app/engines.py
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
-from app.models import Engine, EngineCreate, User
+from app.models import Engine, EngineCreate, QuoteRequest, User
 from app.utils import get_admin_user
 from app.database import db
+from app.search import search_index, tokenize
+from app.availability import exclude_busy_engines, maintenance_intervals, rebuild_calendar, render_calendar
+from app.catalog_io import iter_rows, import_engines, export_engines
+from app.pricing import quote_rows
+from app.cache import engine_cache, engine_key, listing_key, engine_entry, listing_entry, cached_response, invalidate_engine
+from app.pagination import PageParams, page_params, fetch_page, stream_ndjson, stream_cursor, decode_cursor, encode_cursor, NEXT_CURSOR_HEADER
 from datetime import datetime
+from dateutil.relativedelta import relativedelta
+import io
 import uuid
 
 router = APIRouter(prefix="/engines", tags=["Engines"])
 
 @router.get("/", response_model=List[Engine])
 async def list_engines(
+    request: Request,
+    response: Response,
     category: Optional[str] = None,
     brand: Optional[str] = None,
     status: Optional[str] = None,
     location: Optional[str] = None,
-    search: Optional[str] = None
+    search: Optional[str] = None,
+    available_from: Optional[datetime] = None,
+    available_to: Optional[datetime] = None,
+    near_lat: Optional[float] = Query(None, ge=-90, le=90),
+    near_lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0),
+    page: PageParams = Depends(page_params(default_limit=1000)),
 ):
     query = {}
     if category:
@@ -26,21 +43,146 @@ async def list_engines(
         query["status"] = status
     if location:
         query["location"] = location
+    if not tokenize(search):
+        search = None  # uniquement des mots vides ("la", "de"...) : pas de filtre de recherche
     if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
-        ]
+        await search_index.ensure_loaded()
+        ranked_ids = search_index.search(search)
+        if not ranked_ids:
+            return []
+        query["id"] = {"$in": ranked_ids}
+    availability = await exclude_busy_engines(query, available_from, available_to)
+    nearby = near_lat is not None or near_lng is not None
+    if nearby and (near_lat is None or near_lng is None):
+        raise HTTPException(status_code=400, detail="near_lat and near_lng are required together")
+    if radius_km is not None and not nearby:
+        raise HTTPException(status_code=400, detail="radius_km requires near_lat and near_lng")
 
-    engines = await db.engines.find(query).to_list(1000)
+    if nearby:
+        pipeline = _geo_near_pipeline(query, near_lat, near_lng, radius_km)
+        if page.stream:
+            return stream_cursor(db.engines.aggregate(pipeline), Engine)
+        engines = await _nearest_page(pipeline, page, response)
+        return [Engine(**engine) for engine in engines]
+    if page.stream:
+        return stream_ndjson(db.engines, query, page, Engine)
+    if not search and not availability and not page.cursor:
+        return await _cached_listing(request, query, page)
+    if search:
+        engines = await _ranked_page(query, ranked_ids, page, response)
+    else:
+        engines = await fetch_page(db.engines, query, page, response)
     return [Engine(**engine) for engine in engines]
 
+def _geo_near_pipeline(query: dict, lat: float, lng: float, radius_km: Optional[float]) -> List[dict]:
+    # $geoNear applique les autres filtres et trie du plus proche au plus loin via l'index 2dsphere
+    geo_near = {
+        "near": {"type": "Point", "coordinates": [lng, lat]},
+        "distanceField": "distance_m",
+        "query": query,
+        "spherical": True,
+    }
+    if radius_km is not None:
+        geo_near["maxDistance"] = radius_km * 1000
+    return [{"$geoNear": geo_near}]
+
+async def _nearest_page(pipeline: List[dict], page: PageParams, response: Response) -> List[dict]:
+    # L'ordre dépend du point de départ : le curseur porte le rang atteint
+    offset = decode_cursor(page.cursor).get("n", 0) if page.cursor else 0
+    cursor = db.engines.aggregate(pipeline + [{"$skip": offset}, {"$limit": page.limit + 1}])
+    engines = await cursor.to_list(page.limit + 1)
+    if len(engines) > page.limit:
+        engines = engines[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor({"n": offset + page.limit})
+    return engines
+
+async def _cached_listing(request: Request, filters: dict, page: PageParams) -> Response:
+    key = listing_key(filters, page.limit)
+    entry = engine_cache.get(key)
+    if entry is None:
+        generation = engine_cache.generation
+        page_headers = Response()
+        engines = await fetch_page(db.engines, filters, page, page_headers)
+        next_cursor = page_headers.headers.get(NEXT_CURSOR_HEADER)
+        entry = listing_entry(
+            filters,
+            [Engine(**engine) for engine in engines],
+            {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None,
+        )
+        engine_cache.set(key, entry, generation)
+    return cached_response(request, entry)
+
+async def _ranked_page(query: dict, ranked_ids: List[str], page: PageParams, response: Response) -> List[dict]:
+    # Les résultats de recherche suivent l'ordre de pertinence : le curseur porte la position dans le classement
+    position = decode_cursor(page.cursor).get("r", 0) if page.cursor else 0
+    engines = []
+    while len(engines) < page.limit and position < len(ranked_ids):
+        window = ranked_ids[position:position + page.limit]
+        found = {e["id"]: e for e in await db.engines.find({**query, "id": {**query["id"], "$in": window}}).to_list(len(window))}
+        for engine_id in window:
+            position += 1
+            if engine_id in found:
+                engines.append(found[engine_id])
+                if len(engines) == page.limit:
+                    break
+    if position < len(ranked_ids):
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor({"r": position})
+    return engines
+
+@router.post("/import")
+async def bulk_import_engines(
+    file: UploadFile = File(...),
+    fmt: Optional[str] = Query(None, alias="format", pattern="^(csv|ndjson)$"),
+    current_user: User = Depends(get_admin_user),
+):
+    fmt = fmt or ("csv" if (file.filename or "").lower().endswith(".csv") else "ndjson")
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    return await import_engines(iter_rows(stream, fmt))
+
+@router.get("/export")
+async def bulk_export_engines(
+    fmt: str = Query("ndjson", alias="format", pattern="^(csv|ndjson)$"),
+    current_user: User = Depends(get_admin_user),
+):
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(export_engines(fmt), media_type=media_type, headers={
+        "Content-Disposition": f"attachment; filename=engines.{fmt}"
+    })
+
+@router.post("/quote")
+async def quote_engines(quote: QuoteRequest):
+    # Montants calculés comme à la réservation, pour chaque engin × période demandés
+    engine_ids = list(dict.fromkeys(quote.engine_ids))
+    engines = await db.engines.find(
+        {"id": {"$in": engine_ids}}, {"_id": 0, "id": 1, "daily_rate": 1}
+    ).to_list(len(engine_ids))
+    order = {engine_id: i for i, engine_id in enumerate(engine_ids)}
+    engines.sort(key=lambda engine: order[engine["id"]])
+    ranges = [(r.start_date, r.end_date) for r in quote.ranges]
+    return {"ranges": quote.ranges, "quotes": quote_rows(engines, ranges)}
+
 @router.get("/{engine_id}", response_model=Engine)
-async def get_engine(engine_id: str):
-    engine = await db.engines.find_one({"id": engine_id})
-    if not engine:
-        raise HTTPException(status_code=404, detail="Engine not found")
-    return Engine(**engine)
+async def get_engine(engine_id: str, request: Request):
+    entry = engine_cache.get(engine_key(engine_id))
+    if entry is None:
+        generation = engine_cache.generation
+        engine = await db.engines.find_one({"id": engine_id})
+        if not engine:
+            raise HTTPException(status_code=404, detail="Engine not found")
+        entry = engine_entry(Engine(**engine))
+        engine_cache.set(engine_key(engine_id), entry, generation)
+    return cached_response(request, entry)
+
+@router.get("/{engine_id}/calendar")
+async def get_engine_calendar(engine_id: str, months: int = Query(3, ge=1, le=24)):
+    calendar = await db.engine_calendars.find_one({"engine_id": engine_id})
+    if calendar is None or "built_at" not in calendar:
+        if not await db.engines.find_one({"id": engine_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Engine not found")
+        calendar = await rebuild_calendar(engine_id)
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    intervals = calendar.get("intervals", []) + await maintenance_intervals(engine_id)
+    return {"engine_id": engine_id, **render_calendar(intervals, today, today + relativedelta(months=months))}
 
 @router.post("/", response_model=Engine)
 async def create_engine(engine_data: EngineCreate, current_user: User = Depends(get_admin_user)):
@@ -51,6 +193,9 @@ async def create_engine(engine_data: EngineCreate, current_user: User = Depends(
         "created_at": datetime.utcnow()
     })
     await db.engines.insert_one(engine_dict)
+    search_index.add(engine_dict)
+    await search_index.record_change()
+    invalidate_engine(engine_dict["id"], [engine_dict])
     return Engine(**engine_dict)
 
 @router.put("/{engine_id}", response_model=Engine)
@@ -58,8 +203,15 @@ async def update_engine(engine_id: str, engine_data: EngineCreate, current_user:
     existing = await db.engines.find_one({"id": engine_id})
     if not existing:
         raise HTTPException(status_code=404, detail="Engine not found")
-    await db.engines.update_one({"id": engine_id}, {"$set": engine_data.dict()})
+    changes = engine_data.dict()
+    if "geo" not in engine_data.model_fields_set:
+        # Formulaire qui ne mentionne pas les coordonnées : elles sont conservées (geo: null explicite les retire)
+        changes.pop("geo")
+    await db.engines.update_one({"id": engine_id}, {"$set": changes})
     updated = await db.engines.find_one({"id": engine_id})
+    search_index.add(updated)
+    await search_index.record_change()
+    invalidate_engine(engine_id, [existing, updated])
     return Engine(**updated)
 
 @router.delete("/{engine_id}")
@@ -67,4 +219,7 @@ async def delete_engine(engine_id: str, current_user: User = Depends(get_admin_u
     result = await db.engines.delete_one({"id": engine_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Engine not found")
+    search_index.remove(engine_id)
+    await search_index.record_change()
+    invalidate_engine(engine_id)
     return {"message": "Engine deleted successfully"}
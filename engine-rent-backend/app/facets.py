@@ -0,0 +1,74 @@
+# app/facets.py
+# Compteurs par facette (catégorie, marque, statut, ville) pour la barre de filtres du catalogue
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Request
+
+from app.availability import exclude_busy_engines
+from app.cache import facet_cache, facets_key, json_entry, cached_response
+from app.database import db
+from app.search import search_index, tokenize
+
+router = APIRouter(prefix="/engines", tags=["Engines"])
+
+FACET_FIELDS = ["category", "brand", "status", "location"]
+
+
+def facets_pipeline(base: dict, filters: dict) -> list:
+    # Chaque facette compte avec tous les filtres sauf le sien, pour que la barre
+    # affiche aussi les autres valeurs possibles du critère déjà sélectionné
+    facets = {
+        field: [
+            {"$match": {k: v for k, v in filters.items() if k != field}},
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+        ]
+        for field in FACET_FIELDS
+    }
+    facets["total"] = [{"$match": filters}, {"$count": "count"}]
+    return [{"$match": base}, {"$facet": facets}]
+
+
+@router.get("/facets")
+async def engine_facets(
+    request: Request,
+    category: Optional[str] = None,
+    brand: Optional[str] = None,
+    status: Optional[str] = None,
+    location: Optional[str] = None,
+    search: Optional[str] = None,
+    available_from: Optional[datetime] = None,
+    available_to: Optional[datetime] = None,
+):
+    filters = {
+        field: value
+        for field, value in (("category", category), ("brand", brand), ("status", status), ("location", location))
+        if value
+    }
+    base = {}
+    if not tokenize(search):
+        search = None
+    if search:
+        await search_index.ensure_loaded()
+        base["id"] = {"$in": search_index.search(search)}
+    # Les réservations ne déclenchent pas d'invalidation : pas de cache avec une période
+    availability = await exclude_busy_engines(base, available_from, available_to)
+
+    key = facets_key(filters, search)
+    entry = None if availability else facet_cache.get(key)
+    if entry is None:
+        generation = facet_cache.generation
+        result = await db.engines.aggregate(facets_pipeline(base, filters)).to_list(1)
+        facets = result[0] if result else {}
+        total = facets.get("total") or [{"count": 0}]
+        entry = json_entry({
+            **{
+                field: [{"value": bucket["_id"], "count": bucket["count"]} for bucket in facets.get(field, [])]
+                for field in FACET_FIELDS
+            },
+            "total": total[0]["count"],
+        })
+        if not availability:
+            facet_cache.set(key, entry, generation)
+    return cached_response(request, entry)
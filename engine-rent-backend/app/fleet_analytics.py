@@ -0,0 +1,291 @@
+# app/fleet_analytics.py
+# Taux d'utilisation de la flotte : les intervalles de réservations et de maintenances sont
+# projetés sur une matrice engins × jours (NumPy), puis tous les indicateurs sont calculés en
+# une passe vectorisée : jours loués / jours disponibles, périodes d'inactivité, CA mensuel.
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from app.cache import TTLCache
+from app.database import db
+
+RENTED_STATUSES = ["approved", "paid"]      # réservations confirmées : l'engin est immobilisé
+REVENUE_STATUSES = ["paid"]                 # CA réparti uniformément sur les jours de location
+MAINTENANCE_STATUSES = ["scheduled", "in_progress", "completed"]
+MAX_PERIOD_DAYS = 5 * 366
+READ_BATCH_SIZE = 10000
+
+analytics_cache = TTLCache(maxsize=16, ttl=600)
+
+
+@dataclass
+class FleetUtilization:
+    start: datetime
+    end: datetime
+    engine_ids: List[str]
+    names: List[str]
+    categories: np.ndarray          # (E,) indice dans category_names
+    category_names: List[str]
+    months: List[datetime]          # début de chaque colonne mensuelle (la première = start)
+    rented_days: np.ndarray         # (E,)
+    available_days: np.ndarray      # (E,) jours hors maintenance
+    longest_idle: np.ndarray        # (E,) plus longue suite de jours disponibles non loués
+    current_idle: np.ndarray        # (E,) jours d'inactivité à la fin de la période
+    monthly_rented: np.ndarray      # (E, M)
+    monthly_revenue: np.ndarray     # (E, M)
+
+    @property
+    def utilization(self) -> np.ndarray:
+        return np.divide(
+            self.rented_days, self.available_days,
+            out=np.zeros(len(self.engine_ids)), where=self.available_days > 0
+        )
+
+    def category_summary(self) -> List[dict]:
+        n = len(self.category_names)
+        engines = np.bincount(self.categories, minlength=n)
+        rented = np.bincount(self.categories, weights=self.rented_days, minlength=n)
+        available = np.bincount(self.categories, weights=self.available_days, minlength=n)
+        revenue = np.bincount(self.categories, weights=self.monthly_revenue.sum(axis=1), minlength=n)
+        return [
+            {
+                "category": self.category_names[i],
+                "engines": int(engines[i]),
+                "rented_days": int(rented[i]),
+                "available_days": int(available[i]),
+                "utilization": round(float(rented[i] / available[i]), 4) if available[i] else 0.0,
+                "revenue": round(float(revenue[i]), 2),
+            }
+            for i in range(n)
+        ]
+
+    def engine_rows(self, category: Optional[str] = None, sort: str = "utilization",
+                    descending: bool = False, limit: int = 100) -> List[dict]:
+        rows = np.arange(len(self.engine_ids))
+        if category is not None:
+            if category not in self.category_names:
+                return []
+            rows = rows[self.categories[rows] == self.category_names.index(category)]
+        keys = {
+            "utilization": self.utilization,
+            "idle": self.longest_idle,
+            "revenue": self.monthly_revenue.sum(axis=1),
+        }[sort][rows]
+        order = np.argsort(-keys if descending else keys, kind="stable")[:limit]
+        return [self._engine_row(i) for i in rows[order]]
+
+    def engine_detail(self, engine_id: str) -> Optional[dict]:
+        try:
+            i = self.engine_ids.index(engine_id)
+        except ValueError:
+            return None
+        return {
+            **self._engine_row(i),
+            "monthly": [
+                {
+                    "month": month,
+                    "rented_days": int(self.monthly_rented[i, m]),
+                    "revenue": round(float(self.monthly_revenue[i, m]), 2),
+                }
+                for m, month in enumerate(self.months)
+            ],
+        }
+
+    def _engine_row(self, i: int) -> dict:
+        return {
+            "engine_id": self.engine_ids[i],
+            "name": self.names[i],
+            "category": self.category_names[self.categories[i]],
+            "rented_days": int(self.rented_days[i]),
+            "available_days": int(self.available_days[i]),
+            "utilization": round(float(self.utilization[i]), 4),
+            "longest_idle_streak": int(self.longest_idle[i]),
+            "current_idle_streak": int(self.current_idle[i]),
+            "revenue": round(float(self.monthly_revenue[i].sum()), 2),
+        }
+
+
+# -------------------------------------
+# 🧮 CALCUL VECTORISÉ
+# -------------------------------------
+
+def _day_mask(n_engines: int, n_days: int, rows: np.ndarray, first: np.ndarray, last: np.ndarray) -> np.ndarray:
+    # Matrice booléenne (E, D) des jours couverts par au moins un intervalle [first, last) :
+    # tableau de différences (+1 au début, -1 à la fin) puis somme cumulée par ligne
+    width = n_days + 1
+    keep = last > first
+    rows, first, last = rows[keep], first[keep], last[keep]
+    diff = np.bincount(rows * width + first, minlength=n_engines * width).astype(np.int32)
+    diff -= np.bincount(rows * width + last, minlength=n_engines * width).astype(np.int32)
+    return np.cumsum(diff.reshape(n_engines, width), axis=1)[:, :n_days] > 0
+
+
+def _idle_streaks(idle: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Longueur de la suite de jours inactifs se terminant à chaque jour : compteur cumulé
+    # moins sa valeur au dernier jour actif (maximum cumulé des remises à zéro)
+    count = np.cumsum(idle, axis=1, dtype=np.int32)
+    reset = np.maximum.accumulate(np.where(idle, 0, count), axis=1)
+    streak = count - reset
+    return streak.max(axis=1, initial=0), streak[:, -1] if streak.shape[1] else np.zeros(len(idle), np.int32)
+
+
+def compute_utilization(
+    n_engines: int,
+    n_days: int,
+    month_offsets: Sequence[int],
+    reservations: Dict[str, np.ndarray],
+    maintenances: Dict[str, np.ndarray],
+) -> Dict[str, np.ndarray]:
+    # reservations : rows, first, last (jours relatifs, déjà bornés à [0, D]), daily_revenue
+    # maintenances : rows, first, last
+    rented = _day_mask(n_engines, n_days, reservations["rows"], reservations["first"], reservations["last"])
+    blocked = _day_mask(n_engines, n_days, maintenances["rows"], maintenances["first"], maintenances["last"])
+    available = ~blocked
+    rented &= available
+    longest_idle, current_idle = _idle_streaks(available & ~rented)
+
+    # CA journalier : +tarif au premier jour, -tarif après le dernier, somme cumulée
+    width = n_days + 1
+    revenue = reservations["daily_revenue"]
+    paying = (revenue > 0) & (reservations["last"] > reservations["first"])
+    rows, first, last = reservations["rows"][paying], reservations["first"][paying], reservations["last"][paying]
+    diff = np.bincount(rows * width + first, weights=revenue[paying], minlength=n_engines * width)
+    diff -= np.bincount(rows * width + last, weights=revenue[paying], minlength=n_engines * width)
+    daily_revenue = np.cumsum(diff.reshape(n_engines, width), axis=1)[:, :n_days]
+
+    offsets = np.asarray(month_offsets, dtype=np.intp)
+    return {
+        "rented_days": rented.sum(axis=1),
+        "available_days": available.sum(axis=1),
+        "longest_idle": longest_idle,
+        "current_idle": current_idle,
+        "monthly_rented": np.add.reduceat(rented, offsets, axis=1, dtype=np.int32),
+        "monthly_revenue": np.round(np.add.reduceat(daily_revenue, offsets, axis=1), 2),
+    }
+
+
+# -------------------------------------
+# 📥 CHARGEMENT
+# -------------------------------------
+
+def _month_starts(start: datetime, end: datetime) -> List[datetime]:
+    months = [start]
+    month = datetime(start.year, start.month, 1)
+    while True:
+        month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+        if month >= end:
+            return months
+        months.append(month)
+
+
+def _day_numbers(values: List[datetime], origin: datetime) -> np.ndarray:
+    # Position en jours (fractionnaire) de chaque date par rapport à origin
+    seconds = np.array(values, dtype="datetime64[s]") - np.datetime64(origin, "s")
+    return seconds.astype(np.float64) / 86400
+
+
+def _clip_days(days: np.ndarray, n_days: int, ceil: bool) -> np.ndarray:
+    # Bornes à [0, n_days] ; ceil pour une borne de fin exclusive (jour entamé = jour compté)
+    return np.clip(np.ceil(days) if ceil else np.floor(days), 0, n_days).astype(np.int64)
+
+
+async def _load_intervals(collection, query: dict, projection: dict, start_field: str, end_of) -> List[dict]:
+    cursor = collection.find(query, projection).batch_size(READ_BATCH_SIZE)
+    return [doc async for doc in cursor if doc.get(start_field) and end_of(doc)]
+
+
+def _maintenance_end(maintenance: dict) -> Optional[datetime]:
+    # Terminée : jusqu'à sa date de fin ; en cours : jusqu'à maintenant ; planifiée : un jour
+    scheduled = maintenance.get("scheduled_date")
+    if maintenance.get("completed_date"):
+        return max(maintenance["completed_date"], scheduled + timedelta(days=1))
+    if maintenance.get("status") == "in_progress":
+        return max(datetime.utcnow(), scheduled + timedelta(days=1))
+    return scheduled + timedelta(days=1) if scheduled else None
+
+
+def analytics_period(date_from: Optional[datetime], date_to: Optional[datetime]) -> Tuple[datetime, datetime]:
+    # Jours entiers ; par défaut les 12 derniers mois jusqu'à aujourd'hui inclus
+    today = datetime.utcnow()
+    end = date_to or today + timedelta(days=1)
+    end = datetime(end.year, end.month, end.day)
+    start = date_from or end - timedelta(days=365)
+    start = datetime(start.year, start.month, start.day)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="La date de fin doit être postérieure à la date de début")
+    if (end - start).days > MAX_PERIOD_DAYS:
+        raise HTTPException(status_code=400, detail=f"Période limitée à {MAX_PERIOD_DAYS} jours")
+    return start, end
+
+
+async def fleet_utilization(start: datetime, end: datetime) -> FleetUtilization:
+    key = f"{start.isoformat()}:{end.isoformat()}"
+    cached = analytics_cache.get(key)
+    if cached is not None:
+        return cached
+    generation = analytics_cache.generation
+
+    n_days = (end - start).days
+    engines = await db.engines.find({}, {"_id": 0, "id": 1, "name": 1, "category": 1}).to_list(None)
+    index = {engine["id"]: i for i, engine in enumerate(engines)}
+    category_names = sorted({engine.get("category") or "" for engine in engines})
+    category_index = {name: i for i, name in enumerate(category_names)}
+
+    reservations = await _load_intervals(
+        db.reservations,
+        {"status": {"$in": RENTED_STATUSES}, "start_date": {"$lt": end}, "end_date": {"$gt": start}},
+        {"_id": 0, "engine_id": 1, "start_date": 1, "end_date": 1, "total_amount": 1, "status": 1},
+        "start_date", lambda r: r.get("end_date"),
+    )
+    reservations = [r for r in reservations if r["engine_id"] in index]
+    maintenances = await _load_intervals(
+        db.maintenances,
+        {"status": {"$in": MAINTENANCE_STATUSES}, "scheduled_date": {"$lt": end}},
+        {"_id": 0, "engine_id": 1, "scheduled_date": 1, "completed_date": 1, "status": 1},
+        "scheduled_date", _maintenance_end,
+    )
+    maintenances = [m for m in maintenances if m.get("engine_id") in index and _maintenance_end(m) > start]
+
+    def compute() -> FleetUtilization:
+        starts = _day_numbers([r["start_date"] for r in reservations], start)
+        ends = _day_numbers([r["end_date"] for r in reservations], start)
+        # Tarif journalier calculé sur la durée totale de la location, pas sur la part dans la période
+        durations = np.maximum(np.ceil(ends) - np.floor(starts), 1)
+        amounts = np.array([
+            float(r.get("total_amount") or 0) if r["status"] in REVENUE_STATUSES else 0.0 for r in reservations
+        ])
+        months = _month_starts(start, end)
+        metrics = compute_utilization(
+            len(engines), n_days,
+            [(month - start).days for month in months],
+            {
+                "rows": np.array([index[r["engine_id"]] for r in reservations], dtype=np.int64),
+                "first": _clip_days(starts, n_days, False),
+                "last": _clip_days(ends, n_days, True),
+                "daily_revenue": amounts / durations,
+            },
+            {
+                "rows": np.array([index[m["engine_id"]] for m in maintenances], dtype=np.int64),
+                "first": _clip_days(_day_numbers([m["scheduled_date"] for m in maintenances], start), n_days, False),
+                "last": _clip_days(_day_numbers([_maintenance_end(m) for m in maintenances], start), n_days, True),
+            },
+        )
+        return FleetUtilization(
+            start=start,
+            end=end,
+            engine_ids=[engine["id"] for engine in engines],
+            names=[engine.get("name", "") for engine in engines],
+            categories=np.array([category_index[engine.get("category") or ""] for engine in engines], dtype=np.int64),
+            category_names=category_names,
+            months=months,
+            **metrics,
+        )
+
+    # Calcul NumPy hors de la boucle asyncio
+    result = await asyncio.to_thread(compute)
+    analytics_cache.set(key, result, generation)
+    return result
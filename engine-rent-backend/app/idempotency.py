@@ -0,0 +1,126 @@
+# app/idempotency.py
+# En-tête Idempotency-Key pour les endpoints de paiement : la première requête est exécutée et sa
+# réponse stockée (collection idempotency_keys, purgée par un index TTL) ; une répétition renvoie
+# la réponse stockée sans rien réexécuter, et les doublons concurrents attendent la première.
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pymongo.errors import DuplicateKeyError
+
+from app.database import db
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+KEY_TTL = timedelta(hours=24)
+LOCK_SECONDS = 30       # au-delà, une exécution abandonnée (worker tué) peut être reprise
+WAIT_SECONDS = 10       # attente maximale d'un doublon concurrent
+POLL_SECONDS = 0.1
+MAX_KEY_LENGTH = 255
+
+_in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+
+def _replay(record: dict) -> JSONResponse:
+    response = record["response"]
+    return JSONResponse(response["body"], status_code=response["status_code"], headers={REPLAYED_HEADER: "true"})
+
+
+async def _acquire(user_id: str, key: str, fingerprint: str) -> Optional[dict]:
+    # None seulement si ce processus a inséré ou repris l'enregistrement, sinon l'enregistrement existant
+    while True:
+        now = datetime.utcnow()
+        record = {
+            "user_id": user_id,
+            "key": key,
+            "fingerprint": fingerprint,
+            "status": "processing",
+            "locked_until": now + timedelta(seconds=LOCK_SECONDS),
+            "created_at": now,
+            "expires_at": now + KEY_TTL,
+        }
+        try:
+            await db.idempotency_keys.insert_one(record)
+            return None
+        except DuplicateKeyError:
+            pass
+        # Reprise d'une exécution abandonnée
+        taken = await db.idempotency_keys.update_one(
+            {"user_id": user_id, "key": key, "fingerprint": fingerprint, "status": "processing", "locked_until": {"$lt": now}},
+            {"$set": {"locked_until": now + timedelta(seconds=LOCK_SECONDS)}}
+        )
+        if taken.modified_count:
+            return None
+        existing = await db.idempotency_keys.find_one({"user_id": user_id, "key": key}, {"_id": 0})
+        if existing is not None:
+            return existing
+        # Enregistrement supprimé entre-temps (échec d'une requête concurrente) : nouvel essai d'insertion
+
+
+async def _wait_for_response(user_id: str, key: str) -> dict:
+    local = _in_flight.get((user_id, key))
+    if local is not None:
+        # Doublon dans le même processus : on attend directement la première exécution
+        try:
+            await asyncio.wait_for(asyncio.shield(local), timeout=WAIT_SECONDS)
+        except Exception:
+            pass
+    deadline = asyncio.get_running_loop().time() + WAIT_SECONDS
+    while True:
+        record = await db.idempotency_keys.find_one({"user_id": user_id, "key": key}, {"_id": 0})
+        if record is None or record["status"] == "completed":
+            return record
+        if asyncio.get_running_loop().time() >= deadline:
+            raise HTTPException(status_code=409, detail="Une requête avec cette clé d'idempotence est en cours")
+        await asyncio.sleep(POLL_SECONDS)
+
+
+async def run_idempotent(
+    key: Optional[str],
+    user_id: str,
+    fingerprint: str,
+    handler: Callable[[], Awaitable[dict]],
+):
+    # fingerprint identifie l'opération (méthode + ressource) : une clé réutilisée ailleurs est refusée
+    if not key:
+        return await handler()
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Clé d'idempotence trop longue")
+
+    while True:
+        existing = await _acquire(user_id, key, fingerprint)
+        if existing is None:
+            break
+        if existing["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Clé d'idempotence déjà utilisée pour une autre requête")
+        if existing["status"] == "completed":
+            return _replay(existing)
+        record = await _wait_for_response(user_id, key)
+        if record is not None:
+            return _replay(record)
+        # La première exécution a échoué et libéré la clé : on retente l'acquisition
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[(user_id, key)] = future
+    try:
+        body = await handler()
+    except BaseException:
+        # Échec : la clé est libérée pour qu'un nouvel essai réexécute la requête
+        await db.idempotency_keys.delete_one({"user_id": user_id, "key": key, "status": "processing"})
+        raise
+    else:
+        await db.idempotency_keys.update_one(
+            {"user_id": user_id, "key": key},
+            {"$set": {
+                "status": "completed",
+                "response": {"status_code": 200, "body": jsonable_encoder(body)},
+                "completed_at": datetime.utcnow(),
+            }, "$unset": {"locked_until": ""}}
+        )
+        return body
+    finally:
+        future.set_result(None)
+        _in_flight.pop((user_id, key), None)
@@ -2,6 +2,7 @@
 from fastapi import APIRouter
 from app.utils import get_password_hash
 from app.database import db
+from pymongo import UpdateOne
 from datetime import datetime
 import uuid
 
@@ -35,6 +36,7 @@ async def init_sample_data():
             "daily_rate": 350.0,
             "status": "available",
             "location": "Paris",
+            "geo": {"type": "Point", "coordinates": [2.3522, 48.8566]},
             "images": ["https://example.com/excavatrice.jpg"],
             "specifications": {"poids": "20t", "puissance": "140hp"},
             "created_at": datetime.utcnow()
@@ -48,14 +50,17 @@ async def init_sample_data():
             "daily_rate": 400.0,
             "status": "available",
             "location": "Lyon",
+            "geo": {"type": "Point", "coordinates": [4.8357, 45.7640]},
             "images": ["https://example.com/bulldozer.jpg"],
             "specifications": {"poids": "18t", "puissance": "170hp"},
             "created_at": datetime.utcnow()
         }
     ]
 
-    for engine in engines:
-        if not await db.engines.find_one({"name": engine["name"]}):
-            await db.engines.insert_one(engine)
+    # Un seul aller-retour : les engins déjà présents (même nom) ne sont pas modifiés
+    await db.engines.bulk_write(
+        [UpdateOne({"name": engine["name"]}, {"$setOnInsert": engine}, upsert=True) for engine in engines],
+        ordered=False
+    )
 
     return {"message": "Sample data initialized"}
@@ -0,0 +1,276 @@
+# app/invoices.py
+# Factures PDF : rendu reportlab dans un pool de processus (hors boucle asyncio) et cache disque
+# adressé par contenu (<payment_id>/<hash du document>.pdf). Un téléchargement répété lit le
+# fichier sur disque, avec ETag / If-None-Match et requêtes Range. Export groupé en ZIP streamé.
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from io import BytesIO
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+from app.database import db
+from app.loaders import load_many
+
+INVOICE_CACHE_DIR = os.getenv("INVOICE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "enginerent_invoices"))
+INVOICE_WORKERS = int(os.getenv("INVOICE_WORKERS", "2"))
+CHUNK_SIZE = 64 * 1024
+EXPORT_BATCH_SIZE = 50  # factures rendues en parallèle par lot d'export
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_rendering: Dict[str, asyncio.Future] = {}
+
+
+# -------------------------------------
+# 🧾 DOCUMENT
+# -------------------------------------
+
+def invoice_document(
+    payment: dict, reservation: Optional[dict], user: Optional[dict], engine_name: Optional[str] = None
+) -> dict:
+    # Tout ce qui est imprimé sur la facture, et rien d'autre : son hash identifie le PDF.
+    # Le nom de l'engin n'est pas stocké sur la réservation : il est lu dans db.engines par l'appelant
+    created_at = payment.get("created_at")
+    if reservation:
+        label = engine_name or reservation.get("engine_name") or f"Engin {reservation.get('engine_id', 'inconnu')}"
+    else:
+        label = "Inconnue"
+    return {
+        "payment_id": payment["id"],
+        "client": f"{user['name'] if user else 'Inconnu'} ({user['email'] if user else 'Inconnu'})",
+        "reservation": label,
+        "amount": f"{payment['amount']} Ar",
+        "date": created_at.strftime("%Y-%m-%d") if isinstance(created_at, datetime) else str(created_at),
+    }
+
+
+def document_hash(document: dict) -> str:
+    return hashlib.sha256(json.dumps(document, sort_keys=True).encode()).hexdigest()
+
+
+def render_invoice(document: dict) -> bytes:
+    # Exécuté dans un processus du pool : import local pour ne pas charger reportlab dans la boucle
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(100, 800, f"Facture Paiement #{document['payment_id']}")
+    p.setFont("Helvetica", 12)
+    p.drawString(100, 780, f"Client : {document['client']}")
+    p.drawString(100, 760, f"Réservation : {document['reservation']}")
+    p.drawString(100, 740, f"Montant : {document['amount']}")
+    p.drawString(100, 720, f"Date : {document['date']}")
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+# -------------------------------------
+# 💾 CACHE DISQUE
+# -------------------------------------
+
+def invoice_path(payment_id: str, digest: str) -> str:
+    return os.path.join(INVOICE_CACHE_DIR, payment_id, f"{digest}.pdf")
+
+
+def _store(path: str, pdf: bytes):
+    # Écriture atomique (fichier temporaire + rename) puis suppression des versions obsolètes
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp, path)
+    for name in os.listdir(directory):
+        if name != os.path.basename(path) and name.endswith(".pdf"):
+            os.remove(os.path.join(directory, name))
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=INVOICE_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def clear_invoice_cache(payment_id: str):
+    shutil.rmtree(os.path.join(INVOICE_CACHE_DIR, payment_id), ignore_errors=True)
+
+
+async def invoice_file(document: dict) -> Tuple[str, str]:
+    # Retourne (chemin, hash) ; un même document n'est rendu qu'une fois, même en concurrence
+    digest = document_hash(document)
+    path = invoice_path(document["payment_id"], digest)
+    if os.path.exists(path):
+        return path, digest
+
+    pending = _rendering.get(path)
+    if pending is None:
+        pending = asyncio.ensure_future(_render_to_disk(document, path))
+        _rendering[path] = pending
+        pending.add_done_callback(lambda _: _rendering.pop(path, None))
+    await asyncio.shield(pending)
+    return path, digest
+
+
+async def _render_to_disk(document: dict, path: str):
+    loop = asyncio.get_running_loop()
+    pdf = await loop.run_in_executor(_get_pool(), render_invoice, document)
+    await asyncio.to_thread(_store, path, pdf)
+
+
+async def load_invoice_document(payment_id: str) -> dict:
+    payment = await db.payments.find_one({"id": payment_id})
+    if not payment:
+        raise HTTPException(status_code=404, detail="Paiement introuvable")
+    reservation = await db.reservations.find_one({"id": payment["reservation_id"]})
+    user = await db.users.find_one({"id": reservation["user_id"]}) if reservation else None
+    engine = await db.engines.find_one({"id": reservation.get("engine_id")}, {"_id": 0, "name": 1}) if reservation else None
+    return invoice_document(payment, reservation, user, engine.get("name") if engine else None)
+
+
+# -------------------------------------
+# 📤 RÉPONSE (ETag + Range)
+# -------------------------------------
+
+def _byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # Une seule plage "bytes=a-b", "bytes=a-" ou "bytes=-n" ; None si l'en-tête est ignoré
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="Plage demandée invalide", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+async def _read_file(path: str, start: int, length: int):
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        while length > 0:
+            chunk = await f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def file_response(request: Request, path: str, digest: str, filename: str) -> Response:
+    etag = f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=0, must-revalidate",
+        "Content-Disposition": f"inline; filename={filename}",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    size = os.path.getsize(path)
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if "range" in request.headers and (if_range is None or if_range == etag):
+        byte_range = _byte_range(request.headers["range"], size)
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_read_file(path, 0, size), media_type="application/pdf", headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _read_file(path, start, end - start + 1), status_code=206, media_type="application/pdf", headers=headers
+    )
+
+
+# -------------------------------------
+# 🗜️ EXPORT ZIP
+# -------------------------------------
+
+class _ZipSink:
+    # Flux non "seekable" : zipfile écrit alors des descripteurs de données et l'archive
+    # peut être envoyée au fil de l'eau, entrée par entrée
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+async def _batch_documents(payments: List[dict]) -> List[dict]:
+    reservations = await load_many(
+        db.reservations, (p["reservation_id"] for p in payments),
+        {"_id": 0, "id": 1, "user_id": 1, "engine_id": 1}
+    )
+    users = await load_many(
+        db.users, (r["user_id"] for r in reservations.values()),
+        {"_id": 0, "id": 1, "name": 1, "email": 1}
+    )
+    engines = await load_many(
+        db.engines, (r.get("engine_id") for r in reservations.values()),
+        {"_id": 0, "id": 1, "name": 1}
+    )
+    documents = []
+    for payment in payments:
+        reservation = reservations.get(payment["reservation_id"])
+        user = users.get(reservation["user_id"]) if reservation else None
+        engine = engines.get(reservation.get("engine_id")) if reservation else None
+        documents.append(invoice_document(payment, reservation, user, engine.get("name") if engine else None))
+    return documents
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def export_invoices_zip(query: dict) -> AsyncIterator[bytes]:
+    # Les factures manquantes d'un lot sont rendues en parallèle dans le pool de processus ;
+    # chaque entrée est ajoutée à l'archive dès que son PDF est prêt
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        cursor = db.payments.find(query, {"_id": 0}).sort([("created_at", 1), ("id", 1)])
+        while True:
+            payments = await cursor.to_list(EXPORT_BATCH_SIZE)
+            if not payments:
+                break
+            documents = await _batch_documents(payments)
+            for done in asyncio.as_completed([invoice_file(document) for document in documents]):
+                path, digest = await done
+                payment_id = os.path.basename(os.path.dirname(path))
+                archive.writestr(f"facture_{payment_id}.pdf", await asyncio.to_thread(_read_bytes, path))
+                yield sink.drain()
+    yield sink.drain()
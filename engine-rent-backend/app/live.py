@@ -0,0 +1,186 @@
+# app/live.py
+# Flux temps réel pour l'admin : un seul change stream MongoDB par worker (réservations, paiements,
+# engins, tickets) diffusé en Server-Sent Events à tous les abonnés, sous forme de deltas compacts.
+# Nécessite un replica set (un nœud suffit : mongod --replSet rs0 puis rs.initiate()).
+import asyncio
+import json
+from datetime import datetime
+from typing import AsyncIterator, Dict, Optional, Set
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.database import db
+
+WATCHED_FIELDS: Dict[str, list] = {
+    "reservations": ["id", "status", "engine_id", "user_id", "start_date", "end_date", "total_amount"],
+    "payments": ["id", "status", "amount", "reservation_id"],
+    "engines": ["id", "status", "name", "category"],
+    "support_tickets": ["id", "status", "subject", "priority"],
+}
+SUBSCRIBER_QUEUE_SIZE = 256     # au-delà, l'abonné trop lent est déconnecté (il se resynchronise)
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 3000
+RESTART_BASE_SECONDS = 1
+RESTART_MAX_SECONDS = 30
+CHANGE_STREAM_UNSUPPORTED = (40573,)   # serveur standalone : pas de change stream
+RESUME_TOKEN_LOST = (260, 286)         # InvalidResumeToken, ChangeStreamHistoryLost (oplog dépassé)
+
+
+def _pipeline() -> list:
+    # Filtrage et projection côté serveur : seuls les champs utiles traversent le réseau
+    project = {"operationType": 1, "ns.coll": 1, "documentKey": 1, "clusterTime": 1}
+    for coll, fields in WATCHED_FIELDS.items():
+        for field in fields:
+            project[f"fullDocument.{field}"] = 1
+            project[f"updateDescription.updatedFields.{field}"] = 1
+    return [
+        {"$match": {
+            "ns.coll": {"$in": list(WATCHED_FIELDS)},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }},
+        {"$project": project},
+    ]
+
+
+def _jsonable(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+def to_delta(change: dict) -> Optional[dict]:
+    coll = change.get("ns", {}).get("coll")
+    fields = WATCHED_FIELDS.get(coll)
+    if fields is None:
+        return None
+    op = change["operationType"]
+    document = change.get("fullDocument") or {}
+    if op == "update":
+        changed = change.get("updateDescription", {}).get("updatedFields", {})
+        if not changed:
+            return None  # aucun champ suivi n'a changé
+    elif op == "delete":
+        changed = {}
+    else:
+        changed = document
+    # _id (documentKey) est présent pour toutes les opérations, y compris les suppressions et les
+    # mises à jour d'un document déjà supprimé : c'est la clé de rapprochement côté client
+    return {
+        "collection": coll,
+        "op": op,
+        "_id": _jsonable(change.get("documentKey", {}).get("_id")),
+        "id": document.get("id"),
+        "fields": {field: _jsonable(changed[field]) for field in fields if field in changed},
+    }
+
+
+class ChangeFeed:
+    def __init__(self):
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token = None
+        self.available = True
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        if self._task is None and self.available:
+            self._task = asyncio.create_task(self._watch())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._task is not None:
+            # Plus personne à l'écoute : le change stream est fermé jusqu'au prochain abonné, qui
+            # repart de l'instant présent (pas de rejeu de tout ce qui s'est passé entre-temps)
+            self._task.cancel()
+            self._task = None
+            self._resume_token = None
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _publish(self, event: Optional[dict]):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Abonné trop lent : on le coupe plutôt que de bufferiser sans limite
+                self._subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+                queue.put_nowait(None)
+
+    async def _watch(self):
+        delay = RESTART_BASE_SECONDS
+        while True:
+            try:
+                async with db.watch(_pipeline(), full_document="updateLookup", resume_after=self._resume_token) as stream:
+                    delay = RESTART_BASE_SECONDS
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        delta = to_delta(change)
+                        if delta is not None:
+                            self._publish({"type": "change", **delta})
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as exc:
+                if exc.code in CHANGE_STREAM_UNSUPPORTED:
+                    print("📡 Flux temps réel indisponible : MongoDB doit tourner en replica set")
+                    self.available = False
+                    self._publish({"type": "unavailable"})
+                    self._publish(None)
+                    self._task = None
+                    return
+                if exc.code in RESUME_TOKEN_LOST and self._resume_token is not None:
+                    # Point de reprise sorti de l'oplog : des changements sont perdus, les clients rechargent
+                    print("📡 Point de reprise perdu, reprise du flux à l'instant présent")
+                    self._resume_token = None
+                    self._publish({"type": "resync"})
+                    continue
+                print(f"📡 Change stream interrompu ({exc}), reprise dans {delay}s")
+            except PyMongoError as exc:
+                print(f"📡 Change stream interrompu ({exc}), reprise dans {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RESTART_MAX_SECONDS)
+
+
+change_feed = ChangeFeed()
+
+
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+async def sse_stream(request) -> AsyncIterator[bytes]:
+    queue = change_feed.subscribe()
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n".encode()
+        yield _sse("ready", {"available": change_feed.available})
+        if not change_feed.available:
+            return
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield b": ping\n\n"
+                continue
+            if event is None:
+                break
+            # L'événement est partagé entre abonnés : il n'est pas modifié
+            yield _sse(event["type"], {k: v for k, v in event.items() if k != "type"})
+    finally:
+        change_feed.unsubscribe(queue)
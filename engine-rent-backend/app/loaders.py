@@ -0,0 +1,46 @@
+# app/loaders.py
+# Chargement groupé des documents liés : une requête $in par collection au lieu d'un find_one par ligne
+from typing import Dict, Iterable, List, Optional
+
+from app.database import db
+from app.models import PaymentResponse
+
+
+async def load_many(collection, ids: Iterable[Optional[str]], projection: Optional[dict] = None) -> Dict[str, dict]:
+    ids = [i for i in dict.fromkeys(ids) if i is not None]
+    if not ids:
+        return {}
+    docs = await collection.find({"id": {"$in": ids}}, projection).to_list(len(ids))
+    return {doc["id"]: doc for doc in docs}
+
+
+async def enrich_payments(payments: List[dict], current_user) -> List[PaymentResponse]:
+    # Deux requêtes par lot, quelle que soit sa taille (réservations, puis utilisateurs)
+    reservations = await load_many(
+        db.reservations, (p["reservation_id"] for p in payments),
+        {"_id": 0, "id": 1, "user_id": 1, "engine_name": 1}
+    )
+    # user_id n'est pas toujours stocké sur le paiement : on se rabat sur celui de la réservation
+    user_ids = {
+        p["id"]: p.get("user_id") or reservations.get(p["reservation_id"], {}).get("user_id")
+        for p in payments
+    }
+    users = await load_many(db.users, user_ids.values(), {"_id": 0, "id": 1, "email": 1})
+
+    enriched = []
+    for payment in payments:
+        user = users.get(user_ids[payment["id"]])
+        reservation = reservations.get(payment["reservation_id"])
+
+        # Fallback sur current_user.email pour un client, "Inconnu" côté admin
+        user_email = user["email"] if user else (current_user.email if current_user.role != "admin" else "Inconnu")
+        reservation_title = reservation.get("engine_name") if reservation else "Réservation"
+
+        enriched.append(
+            PaymentResponse(
+                **payment,
+                user_email=user_email,
+                reservation_title=reservation_title
+            )
+        )
+    return enriched
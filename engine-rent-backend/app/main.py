@@ -3,12 +3,19 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.auth import router as auth_router
 from app.engines import router as engine_router
+from app.facets import router as facets_router
 from app.reservations import router as reservation_router
 from app.payments import router as payment_router
 from app.maintenance import router as maintenance_router
 from app.support import router as support_router
 from app.dashboard import router as dashboard_router
-from app.database import client
+from app.database import client, ensure_indexes
+from app.outbox import outbox_worker
+from app.invoices import shutdown_pool
+from app.revenue import ensure_revenue_rollups
+from app.passwords import password_hasher
+from app.revocation import revocation_list
+from app.live import change_feed
 from app.routes import admin
 from app.routes import payment
 from app.routes import maintenance
@@ -27,10 +34,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Idempotent-Replayed"],
 )
 
 # Inclusion des routers avec préfixe /api
 app.include_router(auth_router, prefix="/api/auth")
+# Les facettes passent avant /{engine_id}
+app.include_router(facets_router, prefix="/api/engines")
 app.include_router(engine_router, prefix="/api/engines")
 app.include_router(reservation_router, prefix="/api/reservations")
 app.include_router(payment_router, prefix="/api/payments")
@@ -45,6 +55,19 @@ app.include_router(faq.router)
 app.include_router(users.router)
 
 
+@app.on_event("startup")
+async def startup_db_indexes():
+    await ensure_indexes()
+    await ensure_revenue_rollups()
+    outbox_worker.start()
+    await revocation_list.start()
+
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await outbox_worker.stop()
+    await revocation_list.stop()
+    await change_feed.stop()
+    shutdown_pool()
+    password_hasher.shutdown()
     client.close()
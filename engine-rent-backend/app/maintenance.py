@@ -1,26 +1,37 @@
 # app/maintenance.py
-from fastapi import APIRouter, HTTPException, Depends, Form
+from fastapi import APIRouter, HTTPException, Depends, Form, Response
 from app.models import Maintenance, MaintenanceCreate, User
 from app.database import db
+from app.pagination import PageParams, page_params, fetch_page, stream_ndjson
 from app.utils import get_current_user, get_admin_user
+from app.cache import invalidate_engine
+from app.maintenance_scheduler import release_maintenance_slots
 from datetime import datetime
 import uuid
 
 router = APIRouter(prefix="/maintenance", tags=["Maintenance"])
 
 @router.get("/", response_model=list[Maintenance])
-async def get_maintenance(current_user: User = Depends(get_current_user)):
+async def get_maintenance(
+    response: Response,
+    page: PageParams = Depends(page_params(default_limit=1000)),
+    current_user: User = Depends(get_current_user),
+):
     if current_user.role == "admin":
-        maintenance = await db.maintenance.find().to_list(1000)
+        query = {}
     elif current_user.role == "technician":
-        maintenance = await db.maintenance.find({"technician_id": current_user.id}).to_list(1000)
+        query = {"technician_id": current_user.id}
     else:
         raise HTTPException(status_code=403, detail="Not authorized")
+    if page.stream:
+        return stream_ndjson(db.maintenance, query, page, Maintenance)
+    maintenance = await fetch_page(db.maintenance, query, page, response)
     return [Maintenance(**m) for m in maintenance]
 
 @router.post("/", response_model=Maintenance)
 async def create_maintenance(maintenance_data: MaintenanceCreate, current_user: User = Depends(get_admin_user)):
     await db.engines.update_one({"id": maintenance_data.engine_id}, {"$set": {"status": "maintenance"}})
+    invalidate_engine(maintenance_data.engine_id, [{"status": "maintenance"}])
     maintenance_dict = maintenance_data.dict()
     maintenance_dict.update({
         "id": str(uuid.uuid4()),
@@ -43,5 +54,7 @@ async def complete_maintenance(maintenance_id: str, notes: str = Form(...), curr
             "notes": notes
         }
     })
+    await release_maintenance_slots(maintenance_id)
     await db.engines.update_one({"id": maintenance["engine_id"]}, {"$set": {"status": "available"}})
+    invalidate_engine(maintenance["engine_id"], [{"status": "available"}])
     return {"message": "Maintenance completed"}
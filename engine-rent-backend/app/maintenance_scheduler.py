@@ -0,0 +1,293 @@
+# app/maintenance_scheduler.py
+# Planification groupée des maintenances préventives : pour chaque demande (engin, durée, échéance,
+# technicien), premier créneau libre qui ne chevauche ni une réservation active, ni une autre
+# maintenance de l'engin, ni une intervention du technicien. Les demandes sont traitées par
+# échéance croissante (file de priorité) et les résultats écrits par écritures groupées.
+import heapq
+import uuid
+from contextlib import suppress
+from bisect import bisect_right, insort
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import InsertOne
+from pymongo.errors import BulkWriteError
+
+from app.availability import ACTIVE_RESERVATION_STATUSES, OPEN_MAINTENANCE_STATUSES, maintenance_slot_owner
+from app.booking import DUPLICATE_KEY, BookingConflict, claim_slots, release_slots
+from app.database import db
+from app.models import MaintenanceRequest
+
+SLOT_FIELDS = {"scheduled_date", "scheduled_end", "engine_id", "status"}
+NOTICE_DAYS = 1     # sans date au plus tôt : pas de maintenance planifiée pour aujourd'hui
+
+Interval = Tuple[int, int]  # [premier jour, dernier jour exclu) en ordinaux de date
+
+
+def _floor_day(value: datetime) -> int:
+    return value.toordinal()
+
+
+def _ceil_day(value: datetime) -> int:
+    day = value.toordinal()
+    return day if value == datetime(value.year, value.month, value.day) else day + 1
+
+
+def _as_datetime(day: int) -> datetime:
+    d = date.fromordinal(day)
+    return datetime(d.year, d.month, d.day)
+
+
+# -------------------------------------
+# 📐 INTERVALLES
+# -------------------------------------
+
+def merge_intervals(intervals: List[Interval]) -> List[Interval]:
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def earliest_gap(busy_lists: List[List[Interval]], start: int, duration: int) -> int:
+    # Listes fusionnées (disjointes, triées) : on saute directement au premier intervalle qui se
+    # termine après start, puis on parcourt les intervalles des deux listes par début croissant
+    candidates = [
+        islice(busy, bisect_right(busy, start, key=lambda interval: interval[1]), None)
+        for busy in busy_lists
+    ]
+    day = start
+    for busy_start, busy_end in heapq.merge(*candidates):
+        if busy_start >= day + duration:
+            break
+        if busy_end > day:
+            day = busy_end
+    return day
+
+
+# -------------------------------------
+# 📥 CHARGEMENT DES OCCUPATIONS
+# -------------------------------------
+
+def _maintenance_interval(maintenance: dict) -> Optional[Interval]:
+    scheduled = maintenance.get("scheduled_date")
+    if not scheduled:
+        return None
+    start = _floor_day(scheduled)
+    if maintenance.get("scheduled_end"):
+        return start, max(_ceil_day(maintenance["scheduled_end"]), start + 1)
+    return start, start + max(int(maintenance.get("duration_days") or 1), 1)
+
+
+async def _load_busy(engine_ids: List[str], technician_ids: List[str], since: datetime, until: datetime):
+    engine_busy: Dict[str, List[Interval]] = {engine_id: [] for engine_id in engine_ids}
+    technician_busy: Dict[str, List[Interval]] = {technician_id: [] for technician_id in technician_ids}
+
+    # Une requête pour les réservations de tous les engins demandés (index engine_id, status, dates)
+    async for reservation in db.reservations.find(
+        {
+            "engine_id": {"$in": engine_ids},
+            "status": {"$in": ACTIVE_RESERVATION_STATUSES},
+            "start_date": {"$lt": until},
+            "end_date": {"$gt": since},
+        },
+        {"_id": 0, "engine_id": 1, "start_date": 1, "end_date": 1},
+    ):
+        engine_busy[reservation["engine_id"]].append(
+            (_floor_day(reservation["start_date"]), _ceil_day(reservation["end_date"]))
+        )
+
+    # Maintenances déjà prévues : occupent l'engin et le technicien
+    async for maintenance in db.maintenances.find(
+        {
+            "status": {"$in": OPEN_MAINTENANCE_STATUSES},
+            "$or": [{"engine_id": {"$in": engine_ids}}, {"technician_id": {"$in": technician_ids}}],
+        },
+        {"_id": 0, "engine_id": 1, "technician_id": 1, "scheduled_date": 1, "scheduled_end": 1, "duration_days": 1},
+    ):
+        interval = _maintenance_interval(maintenance)
+        if interval is None:
+            continue
+        if maintenance.get("engine_id") in engine_busy:
+            engine_busy[maintenance["engine_id"]].append(interval)
+        if maintenance.get("technician_id") in technician_busy:
+            technician_busy[maintenance["technician_id"]].append(interval)
+
+    return (
+        {key: merge_intervals(value) for key, value in engine_busy.items()},
+        {key: merge_intervals(value) for key, value in technician_busy.items()},
+    )
+
+
+# -------------------------------------
+# 🗓️ PLANIFICATION
+# -------------------------------------
+
+def plan(
+    requests: List[MaintenanceRequest],
+    engine_busy: Dict[str, List[Interval]],
+    technician_busy: Dict[str, List[Interval]],
+    today: int,
+) -> List[dict]:
+    # Échéance la plus proche d'abord ; à échéance égale, la maintenance la plus longue
+    queue = [(_ceil_day(r.deadline), -r.duration_days, i) for i, r in enumerate(requests)]
+    heapq.heapify(queue)
+    results: List[Optional[dict]] = [None] * len(requests)
+    while queue:
+        deadline, _, i = heapq.heappop(queue)
+        request = requests[i]
+        earliest = max(_floor_day(request.earliest) if request.earliest else today + NOTICE_DAYS, today)
+        engine, technician = engine_busy[request.engine_id], technician_busy[request.technician_id]
+        start = earliest_gap([engine, technician], earliest, request.duration_days)
+        if start + request.duration_days > deadline:
+            results[i] = {"result": "no_slot_before_deadline"}
+            continue
+        slot = (start, start + request.duration_days)
+        # Le créneau est libre dans les deux listes : elles restent disjointes et triées
+        insort(engine, slot)
+        insort(technician, slot)
+        results[i] = {"result": "scheduled", "slot": slot}
+    return results
+
+
+def _report(requests: List[MaintenanceRequest], results: List[dict]) -> dict:
+    items = []
+    for request, outcome in zip(requests, results):
+        item = {"engine_id": request.engine_id, "technician_id": request.technician_id, "result": outcome["result"]}
+        if outcome.get("maintenance_id"):
+            item["maintenance_id"] = outcome["maintenance_id"]
+        if outcome.get("slot"):
+            item["scheduled_date"] = _as_datetime(outcome["slot"][0])
+            item["scheduled_end"] = _as_datetime(outcome["slot"][1])
+        items.append(item)
+    summary: Dict[str, int] = {}
+    for item in items:
+        summary[item["result"]] = summary.get(item["result"], 0) + 1
+    return {"summary": summary, "results": items}
+
+
+async def _claim(planned: Dict[int, dict], requests: List[MaintenanceRequest]) -> set:
+    # Les jours retenus sont pris dans reservation_slots (index unique engin/jour) : une réservation
+    # créée entre la lecture et l'écriture gagne, la maintenance concernée est alors annulée
+    slots = [
+        {"engine_id": requests[i].engine_id, "day": _as_datetime(day), "reservation_id": maintenance_slot_owner(o["maintenance_id"])}
+        for i, o in planned.items()
+        for day in range(*o["slot"])
+    ]
+    if not slots:
+        return set()
+    try:
+        await db.reservation_slots.insert_many(slots, ordered=False)
+        return set()
+    except BulkWriteError as exc:
+        errors = exc.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        lost = {slots[error["index"]]["reservation_id"] for error in errors}
+        await db.reservation_slots.delete_many({"reservation_id": {"$in": list(lost)}})
+        return lost
+
+
+async def schedule_maintenances(requests: List[MaintenanceRequest], dry_run: bool = False) -> dict:
+    now = datetime.utcnow()
+    today = _floor_day(now)
+    engine_ids = list({r.engine_id for r in requests})
+    existing = set(await db.engines.distinct("id", {"id": {"$in": engine_ids}}))
+
+    valid = [r for r in requests if r.engine_id in existing]
+    results_by_request: Dict[int, dict] = {
+        id(r): {"result": "engine_not_found"} for r in requests if r.engine_id not in existing
+    }
+    if valid:
+        since = _as_datetime(today)
+        until = max(r.deadline for r in valid) + timedelta(days=1)
+        engine_busy, technician_busy = await _load_busy(
+            list({r.engine_id for r in valid}), list({r.technician_id for r in valid}), since, until
+        )
+        for request, outcome in zip(valid, plan(valid, engine_busy, technician_busy, today)):
+            results_by_request[id(request)] = outcome
+
+    planned = {
+        i: outcome for i, outcome in
+        ((i, results_by_request[id(r)]) for i, r in enumerate(requests))
+        if outcome["result"] == "scheduled"
+    }
+    if planned and not dry_run:
+        for outcome in planned.values():
+            outcome["maintenance_id"] = str(uuid.uuid4())
+        lost = await _claim(planned, requests)
+        writes = []
+        for i, outcome in planned.items():
+            if maintenance_slot_owner(outcome["maintenance_id"]) in lost:
+                outcome.update({"result": "conflict", "maintenance_id": None, "slot": None})
+                continue
+            request = requests[i]
+            start, end = outcome["slot"]
+            writes.append(InsertOne({
+                "id": outcome["maintenance_id"],
+                "engine_id": request.engine_id,
+                "type": request.type,
+                "description": request.description,
+                "technician_id": request.technician_id,
+                "scheduled_date": _as_datetime(start),
+                "scheduled_end": _as_datetime(end),
+                "duration_days": request.duration_days,
+                "deadline": request.deadline,
+                "status": "scheduled",
+                "created_at": now,
+            }))
+        if writes:
+            await db.maintenances.bulk_write(writes, ordered=False)
+
+    return _report(requests, [results_by_request[id(r)] for r in requests])
+
+
+# -------------------------------------
+# 🔓 JOURS RÉSERVÉS APRÈS PLANIFICATION
+# -------------------------------------
+
+async def release_maintenance_slots(maintenance_id: str):
+    # Maintenance terminée, annulée ou supprimée : ses jours redeviennent réservables
+    await release_slots(maintenance_slot_owner(maintenance_id))
+
+
+def _parse_date(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+    return value
+
+
+async def _claim_days(maintenance: dict):
+    # Seuls les jours à venir sont repris : les jours passés ne bloquent plus aucune réservation
+    start, end = maintenance.get("scheduled_date"), maintenance.get("scheduled_end")
+    if maintenance.get("status") not in OPEN_MAINTENANCE_STATUSES or not start or not end:
+        return
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = max(start, today)
+    if start < end:
+        await claim_slots(maintenance["engine_id"], maintenance_slot_owner(maintenance["id"]), start, end)
+
+
+async def sync_maintenance_slots(maintenance: dict, changes: dict) -> dict:
+    # Appelée avant d'appliquer changes : les jours réservés suivent les nouvelles dates, l'engin et
+    # le statut. Lève BookingConflict si les nouveaux jours sont pris (les anciens sont alors repris).
+    # Renvoie changes avec les dates converties en datetime
+    changes = {**changes}
+    for field in ("scheduled_date", "scheduled_end"):
+        if field in changes:
+            changes[field] = _parse_date(changes[field])
+    if not SLOT_FIELDS & changes.keys():
+        return changes
+    await release_maintenance_slots(maintenance["id"])
+    try:
+        await _claim_days({**maintenance, **changes})
+    except BookingConflict:
+        with suppress(BookingConflict):
+            await _claim_days(maintenance)
+        raise
+    return changes
@@ -1,6 +1,6 @@
 # app/models.py
-from pydantic import BaseModel, EmailStr, Field
-from typing import List, Dict, Optional, Any
+from pydantic import BaseModel, EmailStr, Field, field_validator
+from typing import List, Dict, Optional, Any, Literal
 from datetime import datetime
 
 # --- USER MODELS ---
@@ -32,6 +32,18 @@ class UserInDB(BaseModel):
     }
 # --- ENGINE MODELS ---
 
+class GeoPoint(BaseModel):
+    type: Literal["Point"] = "Point"
+    coordinates: List[float] = Field(..., min_length=2, max_length=2)  # [longitude, latitude] (GeoJSON)
+
+    @field_validator("coordinates")
+    @classmethod
+    def check_coordinates(cls, value: List[float]) -> List[float]:
+        longitude, latitude = value
+        if not -180 <= longitude <= 180 or not -90 <= latitude <= 90:
+            raise ValueError("Coordonnées invalides")
+        return value
+
 class Engine(BaseModel):
     id: str
     name: str
@@ -41,6 +53,7 @@ class Engine(BaseModel):
     daily_rate: float
     status: str = "available"
     location: str
+    geo: Optional[GeoPoint] = None
     images: List[str] = []
     specifications: Dict[str, Any] = {}
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -52,9 +65,18 @@ class EngineCreate(BaseModel):
     brand: str
     daily_rate: float
     location: str
+    geo: Optional[GeoPoint] = None
     images: List[str] = []
     specifications: Dict[str, Any] = {}
 
+class QuoteRange(BaseModel):
+    start_date: datetime
+    end_date: datetime
+
+class QuoteRequest(BaseModel):
+    engine_ids: List[str] = Field(..., min_length=1, max_length=1000)
+    ranges: List[QuoteRange] = Field(..., min_length=1, max_length=50)
+
 # --- RESERVATION MODELS ---
 
 class Reservation(BaseModel):
@@ -72,6 +94,9 @@ class ReservationCreate(BaseModel):
     start_date: datetime
     end_date: datetime
 
+class ReservationBatch(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=1000)
+
 # --- PAYMENT MODELS ---
 # --- PAYMENT MODELS ---
 
@@ -110,6 +135,19 @@ class MaintenanceCreate(BaseModel):
     scheduled_date: datetime
     technician_id: str
 
+class MaintenanceRequest(BaseModel):
+    engine_id: str
+    type: str
+    description: str
+    technician_id: str
+    duration_days: int = Field(..., ge=1, le=90)
+    deadline: datetime
+    earliest: Optional[datetime] = None
+
+class MaintenanceScheduleBatch(BaseModel):
+    requests: List[MaintenanceRequest] = Field(..., min_length=1, max_length=10000)
+    dry_run: bool = False
+
 # --- SUPPORT TICKET MODELS ---
 
 class SupportTicket(BaseModel):
@@ -133,6 +171,11 @@ class SupportTicketCreate(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 # --- FAQ MODELS ---
 
@@ -0,0 +1,218 @@
+# app/outbox.py
+# Boîte d'envoi persistante : les routes enregistrent l'email, un worker asyncio l'envoie.
+# Envoi réel via SMTP si SMTP_HOST est défini, sinon simulation console (send_email).
+# Pour tester en local : python -m aiosmtpd -n -l localhost:1025 puis SMTP_HOST=localhost SMTP_PORT=1025
+import asyncio
+import os
+import smtplib
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from app.database import db
+
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "false").lower() == "true"
+SMTP_FROM = os.getenv("SMTP_FROM", "no-reply@enginerent.com")
+
+BATCH_SIZE = 50             # emails envoyés sur une même connexion SMTP
+CONCURRENCY = 4             # connexions SMTP simultanées par worker
+POLL_SECONDS = 5.0
+SMTP_TIMEOUT = 30
+LEASE_SECONDS = 120         # au-delà, un envoi "sending" abandonné (worker tué) est repris
+LEASE_RENEW_SECONDS = 30    # un worker vivant prolonge son bail tant que le lot est en cours d'envoi
+MAX_ATTEMPTS = 8            # puis l'email passe en "dead" (dead-letter)
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 6 * 3600
+
+_wakeup = asyncio.Event()
+
+
+# -------------------------------------
+# 📮 MISE EN FILE
+# -------------------------------------
+
+async def enqueue_email(to_email: str, subject: str, body: str):
+    now = datetime.utcnow()
+    await db.email_outbox.insert_one({
+        "id": str(uuid.uuid4()),
+        "to": to_email,
+        "subject": subject,
+        "body": body,
+        "status": "pending",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now
+    })
+    _wakeup.set()
+
+
+# -------------------------------------
+# 📤 ENVOI
+# -------------------------------------
+
+def _deliver(messages: List[dict]) -> Dict[str, Optional[str]]:
+    # Bloquant (smtplib) : exécuté dans un thread. Retourne {id: None si envoyé, sinon l'erreur}
+    if not SMTP_HOST:
+        from app.utils import send_email  # simulation console uniquement
+
+        for message in messages:
+            send_email(message["to"], message["subject"], message["body"])
+        return {message["id"]: None for message in messages}
+
+    results: Dict[str, Optional[str]] = {}
+    try:
+        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT) as smtp:
+            if SMTP_STARTTLS:
+                smtp.starttls()
+            if SMTP_USER:
+                smtp.login(SMTP_USER, SMTP_PASSWORD or "")
+            for message in messages:
+                email = EmailMessage()
+                email["From"] = SMTP_FROM
+                email["To"] = message["to"]
+                email["Subject"] = message["subject"]
+                email.set_content(message["body"])
+                try:
+                    smtp.send_message(email)
+                    results[message["id"]] = None
+                except smtplib.SMTPRecipientsRefused as exc:
+                    results[message["id"]] = f"Destinataire refusé : {exc.recipients}"
+                except smtplib.SMTPDataError as exc:
+                    results[message["id"]] = f"Erreur SMTP {exc.smtp_code}"
+    except (OSError, smtplib.SMTPException) as exc:
+        for message in messages:
+            results.setdefault(message["id"], f"Connexion SMTP : {exc}")
+    return results
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1)))
+
+
+async def _claim_batch(worker_id: str) -> List[dict]:
+    # Réservation atomique d'un lot : plusieurs workers (ou processus) peuvent vider la même file
+    now = datetime.utcnow()
+    due = {"$or": [
+        {"status": "pending", "next_attempt_at": {"$lte": now}},
+        {"status": "sending", "lease_until": {"$lt": now}},
+    ]}
+    candidates = await db.email_outbox.find(due, {"_id": 0, "id": 1}).sort("next_attempt_at", 1).to_list(BATCH_SIZE)
+    if not candidates:
+        return []
+    claim = f"{worker_id}:{uuid.uuid4()}"
+    await db.email_outbox.update_many(
+        {"$and": [{"id": {"$in": [c["id"] for c in candidates]}}, due]},
+        {"$set": {"status": "sending", "claim": claim, "lease_until": now + timedelta(seconds=LEASE_SECONDS)}}
+    )
+    return await db.email_outbox.find({"claim": claim, "status": "sending"}).to_list(BATCH_SIZE)
+
+
+async def _renew_lease(claim: str):
+    # Un lot de BATCH_SIZE emails peut durer plus que LEASE_SECONDS (SMTP_TIMEOUT par message) :
+    # sans renouvellement, un autre worker reprendrait le lot et enverrait les emails en double
+    while True:
+        await asyncio.sleep(LEASE_RENEW_SECONDS)
+        try:
+            await db.email_outbox.update_many(
+                {"claim": claim, "status": "sending"},
+                {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)}}
+            )
+        except PyMongoError as exc:
+            print(f"📧 Outbox : renouvellement du bail impossible ({exc})")
+
+
+async def _send_batch(messages: List[dict]):
+    renewal = asyncio.create_task(_renew_lease(messages[0]["claim"]))
+    try:
+        results = await asyncio.to_thread(_deliver, messages)
+    finally:
+        renewal.cancel()
+    now = datetime.utcnow()
+    updates = []
+    for message in messages:
+        error = results.get(message["id"], "Résultat d'envoi manquant")
+        if error is None:
+            update = {"$set": {"status": "sent", "sent_at": now}, "$unset": {"lease_until": "", "claim": ""}}
+        else:
+            attempts = message.get("attempts", 0) + 1
+            update = {
+                "$set": {
+                    "status": "dead" if attempts >= MAX_ATTEMPTS else "pending",
+                    "attempts": attempts,
+                    "last_error": error,
+                    "next_attempt_at": now + _retry_delay(attempts),
+                },
+                "$unset": {"lease_until": "", "claim": ""},
+            }
+        updates.append(UpdateOne({"id": message["id"], "claim": message["claim"]}, update))
+    await db.email_outbox.bulk_write(updates, ordered=False)
+
+
+# -------------------------------------
+# ⚙️ WORKER
+# -------------------------------------
+
+class OutboxWorker:
+    def __init__(self, concurrency: int = CONCURRENCY):
+        self.worker_id = str(uuid.uuid4())
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stopping.set()
+        _wakeup.set()
+        if self._task is not None:
+            await self._task
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            await self._semaphore.acquire()
+            _wakeup.clear()
+            try:
+                batch = await _claim_batch(self.worker_id)
+            except Exception as exc:
+                self._semaphore.release()
+                print(f"📧 Outbox : lecture impossible ({exc})")
+                await self._sleep()
+                continue
+            if not batch:
+                self._semaphore.release()
+                await self._sleep()
+                continue
+            task = asyncio.create_task(self._process(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _process(self, batch: List[dict]):
+        try:
+            await _send_batch(batch)
+        except Exception as exc:
+            # Le bail expirera et le lot sera repris par un worker
+            print(f"📧 Outbox : échec du lot ({exc})")
+        finally:
+            self._semaphore.release()
+
+    async def _sleep(self):
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+outbox_worker = OutboxWorker()
@@ -0,0 +1,146 @@
+# app/pagination.py
+# Pagination par curseur (keyset sur created_at, id) et streaming NDJSON partagés par les listes
+import base64
+import json
+from datetime import datetime
+from typing import Any, Awaitable, Callable, List, Optional, Type
+
+from fastapi import HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+SORT_KEYS = [("created_at", -1), ("id", -1)]
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+STREAM_BATCH_SIZE = 200
+
+
+class PageParams:
+    def __init__(self, limit: int, cursor: Optional[str], stream: bool):
+        self.limit = limit
+        self.cursor = cursor
+        self.stream = stream
+
+
+def page_params(default_limit: int = 100, max_limit: int = 1000):
+    def dependency(
+        limit: int = Query(default_limit, ge=1, le=max_limit),
+        cursor: Optional[str] = None,
+        stream: bool = False,
+    ) -> PageParams:
+        return PageParams(limit, cursor, stream)
+    return dependency
+
+
+# -------------------------------------
+# 🔖 CURSEURS OPAQUES
+# -------------------------------------
+
+def encode_cursor(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> dict:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+    return payload
+
+
+def cursor_for(doc: dict) -> str:
+    created_at = doc.get("created_at")
+    return encode_cursor({
+        "c": created_at.isoformat() if isinstance(created_at, datetime) else None,
+        "i": doc.get("id"),
+    })
+
+
+def keyset_query(query: dict, token: Optional[str]) -> dict:
+    # Documents strictement "après" le curseur dans l'ordre (created_at desc, id desc).
+    # Les documents sans created_at sont triés en dernier par Mongo.
+    if not token:
+        return query
+    payload = decode_cursor(token)
+    last_id = payload.get("i")
+    if payload.get("c") is None:
+        after = {"created_at": None, "id": {"$lt": last_id}}
+    else:
+        try:
+            created_at = datetime.fromisoformat(payload["c"])
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+        after = {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": last_id}},
+            {"created_at": None},
+        ]}
+    return {"$and": [query, after]} if query else after
+
+
+def _prepare(doc: dict) -> dict:
+    if "_id" in doc:
+        doc["_id"] = str(doc["_id"])
+    return doc
+
+
+# -------------------------------------
+# 📄 PAGE UNIQUE
+# -------------------------------------
+
+async def fetch_page(collection, query: dict, page: PageParams, response: Response) -> List[dict]:
+    # Lit limit + 1 documents pour savoir s'il reste une page, sans compter la collection
+    cursor = collection.find(keyset_query(query, page.cursor)).sort(SORT_KEYS).limit(page.limit + 1)
+    docs = await cursor.to_list(page.limit + 1)
+    if len(docs) > page.limit:
+        docs = docs[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = cursor_for(docs[-1])
+    return [_prepare(doc) for doc in docs]
+
+
+# -------------------------------------
+# 🌊 STREAMING NDJSON
+# -------------------------------------
+
+def _dump(item: Any, model: Optional[Type[BaseModel]]) -> bytes:
+    if model is not None:
+        if not isinstance(item, BaseModel):
+            item = model(**item)
+        return item.model_dump_json().encode() + b"\n"
+    return json.dumps(jsonable_encoder(item), default=str).encode() + b"\n"
+
+
+def stream_ndjson(
+    collection,
+    query: dict,
+    page: PageParams,
+    model: Optional[Type[BaseModel]] = None,
+    transform: Optional[Callable[[List[dict]], Awaitable[List[Any]]]] = None,
+) -> StreamingResponse:
+    cursor = collection.find(keyset_query(query, page.cursor)).sort(SORT_KEYS).batch_size(STREAM_BATCH_SIZE)
+    return stream_cursor(cursor, model, transform)
+
+
+def stream_cursor(
+    cursor,
+    model: Optional[Type[BaseModel]] = None,
+    transform: Optional[Callable[[List[dict]], Awaitable[List[Any]]]] = None,
+) -> StreamingResponse:
+    # Les documents sont émis au fil des batchs Motor : la mémoire reste bornée par STREAM_BATCH_SIZE
+    async def generate():
+        batch: List[dict] = []
+        async for doc in cursor:
+            batch.append(_prepare(doc))
+            if len(batch) >= STREAM_BATCH_SIZE:
+                for item in (await transform(batch) if transform else batch):
+                    yield _dump(item, model)
+                batch = []
+        if batch:
+            for item in (await transform(batch) if transform else batch):
+                yield _dump(item, model)
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
@@ -0,0 +1,85 @@
+# app/pricing.py
+# Source unique de tarification : devis du catalogue (par lots, NumPy) et montant des réservations.
+# Les coefficients sont entiers (en %) pour que les sommes de jours soient exactes : un devis
+# et la réservation correspondante donnent toujours exactement le même montant.
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# 1970-01-05 était un lundi : sert d'origine pour calculer le jour de la semaine (lundi = 0)
+_MONDAY = np.datetime64("1970-01-05", "D")
+
+
+@dataclass(frozen=True)
+class PricingRules:
+    weekday_pct: Tuple[int, ...] = (100, 100, 100, 100, 100, 100, 100)  # lundi -> dimanche
+    month_pct: Tuple[int, ...] = (100,) * 12                             # janvier -> décembre
+    long_rental_discounts: Tuple[Tuple[int, int], ...] = field(default_factory=tuple)  # (jours min, % remise)
+
+    def discount_pct(self, days: np.ndarray) -> np.ndarray:
+        discount = np.zeros(days.shape, dtype=np.int64)
+        for min_days, pct in sorted(self.long_rental_discounts):
+            discount = np.where(days >= min_days, pct, discount)
+        return discount
+
+
+PRICING_RULES = PricingRules()
+
+
+def rental_days(start: datetime, end: datetime) -> int:
+    return (end - start).days
+
+
+def _range_weights(ranges: Sequence[Tuple[datetime, datetime]], rules: PricingRules):
+    # Pour chaque période : nombre de jours facturés et somme entière des coefficients jour × saison
+    firsts = np.array([np.datetime64(start.date(), "D") for start, _ in ranges])
+    days = np.array([rental_days(start, end) for start, end in ranges], dtype=np.int64)
+    billable = np.maximum(days, 0)
+
+    origin = firsts.min()
+    span = int((firsts - origin).astype(np.int64).max() + billable.max())
+    axis = origin + np.arange(span, dtype=np.int64)
+    weekday = (axis - _MONDAY).astype(np.int64) % 7
+    month = axis.astype("datetime64[M]").astype(np.int64) % 12
+    daily = np.asarray(rules.weekday_pct, dtype=np.int64)[weekday] * np.asarray(rules.month_pct, dtype=np.int64)[month]
+
+    # Somme par période via sommes cumulées (entiers : aucun arrondi)
+    cumulative = np.concatenate(([0], np.cumsum(daily)))
+    offsets = (firsts - origin).astype(np.int64)
+    weights = cumulative[offsets + billable] - cumulative[offsets]
+    return days, weights
+
+
+def quote_matrix(
+    daily_rates: Sequence[float],
+    ranges: Sequence[Tuple[datetime, datetime]],
+    rules: PricingRules = PRICING_RULES,
+) -> np.ndarray:
+    # Matrice engins × périodes des montants (NaN pour une période invalide)
+    rates = np.asarray(daily_rates, dtype=np.float64)
+    if not len(ranges):
+        return np.empty((len(rates), 0))
+    days, weights = _range_weights(ranges, rules)
+    # weights est en 1/10000 (jour % × saison %), la remise en % : facteur entier en 1/1 000 000
+    factor = weights * (100 - rules.discount_pct(days))
+    prices = np.round(rates[:, None] * factor[None, :] / 1_000_000, 2)
+    prices[:, days <= 0] = np.nan
+    return prices
+
+
+def reservation_price(daily_rate: float, start: datetime, end: datetime, rules: PricingRules = PRICING_RULES) -> float:
+    # Chemin de réservation : même calcul que les devis, pour une seule case de la matrice
+    return float(quote_matrix([daily_rate], [(start, end)], rules)[0, 0])
+
+
+def quote_rows(engines: List[dict], ranges: Sequence[Tuple[datetime, datetime]]) -> List[dict]:
+    prices = quote_matrix([engine.get("daily_rate", 0) for engine in engines], ranges)
+    return [
+        {
+            "engine_id": engine["id"],
+            "prices": [None if np.isnan(price) else float(price) for price in row],
+        }
+        for engine, row in zip(engines, prices)
+    ]
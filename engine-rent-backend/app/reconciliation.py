@@ -0,0 +1,172 @@
+# app/reconciliation.py
+# Rapprochement réservations / paiements : les deux collections sont lues triées par identifiant
+# de réservation et fusionnées (merge-join), en mémoire bornée. Les écarts sont écrits dans
+# reconciliation_mismatches et l'avancement dans reconciliation_runs pour pouvoir reprendre.
+import json
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from app.database import db
+from app.revenue import REVENUE_STATUSES
+
+READ_BATCH_SIZE = 5000
+CHECKPOINT_EVERY = 10000    # réservations traitées entre deux points de reprise
+AMOUNT_TOLERANCE = 0.01
+
+RESERVATION_FIELDS = {"_id": 0, "id": 1, "status": 1, "total_amount": 1}
+PAYMENT_FIELDS = {"_id": 0, "id": 1, "reservation_id": 1, "amount": 1, "status": 1}
+
+
+# -------------------------------------
+# 🔍 RÈGLES
+# -------------------------------------
+
+def check_reservation(reservation: Optional[dict], payments: List[dict]) -> List[dict]:
+    # Écarts pour un identifiant de réservation (réservation absente = paiements orphelins)
+    collected = [p for p in payments if p.get("status") in REVENUE_STATUSES]
+    if reservation is None:
+        return [{"kind": "orphan_payment", "payment_ids": [p["id"] for p in payments]}]
+
+    mismatches = []
+    paid = reservation.get("status") == "paid"
+    if paid and not collected:
+        mismatches.append({"kind": "paid_without_payment", "reservation_status": reservation.get("status")})
+    if collected and not paid:
+        # Chemin approve_reservation + /payments/{id}/process : le paiement est encaissé
+        # mais la réservation n'est jamais passée à "paid"
+        mismatches.append({
+            "kind": "collected_not_marked_paid",
+            "reservation_status": reservation.get("status"),
+            "payment_ids": [p["id"] for p in collected],
+        })
+    if len(collected) > 1:
+        mismatches.append({"kind": "duplicate_payment", "payment_ids": [p["id"] for p in collected]})
+    if collected:
+        received = sum(float(p.get("amount") or 0) for p in collected)
+        expected = float(reservation.get("total_amount") or 0)
+        if abs(received - expected) > AMOUNT_TOLERANCE:
+            mismatches.append({
+                "kind": "amount_mismatch",
+                "expected": expected,
+                "received": round(received, 2),
+                "payment_ids": [p["id"] for p in collected],
+            })
+    return mismatches
+
+
+# -------------------------------------
+# 🔀 MERGE-JOIN
+# -------------------------------------
+
+async def _reservations(after: Optional[str]) -> AsyncIterator[dict]:
+    query = {"id": {"$gt": after}} if after else {"id": {"$ne": None}}
+    async for reservation in db.reservations.find(query, RESERVATION_FIELDS).sort("id", 1).batch_size(READ_BATCH_SIZE):
+        yield reservation
+
+
+async def _payment_groups(after: Optional[str]) -> AsyncIterator[Tuple[str, List[dict]]]:
+    # Paiements regroupés par reservation_id (quelques documents par groupe)
+    query = {"reservation_id": {"$gt": after}} if after else {"reservation_id": {"$ne": None}}
+    cursor = db.payments.find(query, PAYMENT_FIELDS).sort([("reservation_id", 1), ("created_at", -1), ("id", -1)])
+    key, group = None, []
+    async for payment in cursor.batch_size(READ_BATCH_SIZE):
+        if payment["reservation_id"] != key and group:
+            yield key, group
+            group = []
+        key = payment["reservation_id"]
+        group.append(payment)
+    if group:
+        yield key, group
+
+
+async def _next(iterator):
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def merge_join(after: Optional[str] = None) -> AsyncIterator[Tuple[str, Optional[dict], List[dict]]]:
+    # Produit (reservation_id, réservation ou None, paiements) dans l'ordre croissant des identifiants
+    reservations, groups = _reservations(after), _payment_groups(after)
+    reservation, group = await _next(reservations), await _next(groups)
+    while reservation is not None or group is not None:
+        if group is None or (reservation is not None and reservation["id"] < group[0]):
+            yield reservation["id"], reservation, []
+            reservation = await _next(reservations)
+        elif reservation is None or group[0] < reservation["id"]:
+            yield group[0], None, group[1]
+            group = await _next(groups)
+        else:
+            yield reservation["id"], reservation, group[1]
+            reservation, group = await _next(reservations), await _next(groups)
+
+
+# -------------------------------------
+# 📝 EXÉCUTION & REPRISE
+# -------------------------------------
+
+async def _flush(run_id: str, pending: List[dict], position: Optional[str], counters: dict, report=None):
+    # Écarts d'abord (upserts idempotents), point de reprise ensuite : une reprise après
+    # interruption peut réécrire les mêmes écarts sans les dupliquer
+    if pending:
+        await db.reconciliation_mismatches.bulk_write([
+            UpdateOne(
+                {"run_id": run_id, "reservation_id": m["reservation_id"], "kind": m["kind"]},
+                {"$set": m},
+                upsert=True,
+            )
+            for m in pending
+        ], ordered=False)
+        if report is not None:
+            for mismatch in pending:
+                report.write(json.dumps(mismatch, default=str, ensure_ascii=False) + "\n")
+            report.flush()
+    await db.reconciliation_runs.update_one(
+        {"id": run_id},
+        {"$set": {"last_reservation_id": position, "counters": counters, "updated_at": datetime.utcnow()}}
+    )
+
+
+async def reconcile(run_id: Optional[str] = None, report=None) -> dict:
+    # run_id existant : reprise après le dernier point de reprise ; sinon nouvelle exécution
+    run = await db.reconciliation_runs.find_one({"id": run_id}, {"_id": 0}) if run_id else None
+    if run_id and run is None:
+        raise ValueError(f"Exécution de rapprochement inconnue : {run_id}")
+    if run is None:
+        run = {
+            "id": str(uuid.uuid4()),
+            "status": "running",
+            "last_reservation_id": None,
+            "counters": {"reservations": 0, "payments": 0, "mismatches": 0},
+            "started_at": datetime.utcnow(),
+        }
+        await db.reconciliation_runs.insert_one(dict(run))
+    elif run["status"] == "completed":
+        return run
+
+    counters = dict(run["counters"])
+    pending: List[dict] = []
+    position, since_checkpoint = run["last_reservation_id"], 0
+    now = datetime.utcnow()
+
+    async for reservation_id, reservation, payments in merge_join(run["last_reservation_id"]):
+        counters["reservations"] += reservation is not None
+        counters["payments"] += len(payments)
+        for mismatch in check_reservation(reservation, payments):
+            pending.append({"run_id": run["id"], "reservation_id": reservation_id, "detected_at": now, **mismatch})
+        position, since_checkpoint = reservation_id, since_checkpoint + 1
+        if since_checkpoint >= CHECKPOINT_EVERY:
+            counters["mismatches"] += len(pending)
+            await _flush(run["id"], pending, position, counters, report)
+            pending, since_checkpoint = [], 0
+
+    counters["mismatches"] += len(pending)
+    await _flush(run["id"], pending, position, counters, report)
+    await db.reconciliation_runs.update_one(
+        {"id": run["id"]}, {"$set": {"status": "completed", "finished_at": datetime.utcnow()}}
+    )
+    return {**run, "counters": counters, "last_reservation_id": position, "status": "completed"}
@@ -0,0 +1,118 @@
+# app/reservation_batch.py
+# Approbation / rejet de réservations par lots : une lecture, puis des écritures groupées
+import uuid
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.availability import calendar_remove_many, calendar_set_status_many
+from app.booking import release_slots_many
+from app.cache import invalidate_engine
+from app.database import db, run_in_transaction
+
+BATCH_STATUS_REQUIRED = "pending"
+
+
+async def _load(reservation_ids: List[str]) -> Tuple[Dict[str, dict], Dict[str, str]]:
+    # Une seule requête pour valider tout le lot ; chaque id reçoit un résultat
+    ids = list(dict.fromkeys(reservation_ids))
+    found = {
+        r["id"]: r
+        for r in await db.reservations.find(
+            {"id": {"$in": ids}},
+            {"_id": 0, "id": 1, "engine_id": 1, "total_amount": 1, "status": 1}
+        ).to_list(len(ids))
+    }
+    outcomes, eligible = {}, {}
+    for reservation_id in ids:
+        reservation = found.get(reservation_id)
+        if reservation is None:
+            outcomes[reservation_id] = "not_found"
+        elif reservation["status"] != BATCH_STATUS_REQUIRED:
+            outcomes[reservation_id] = f"invalid_status:{reservation['status']}"
+        else:
+            eligible[reservation_id] = reservation
+    return eligible, outcomes
+
+
+async def _apply_status(eligible: Dict[str, dict], outcomes: Dict[str, str], status: str, session) -> List[str]:
+    # Le filtre sur le statut protège d'une modification concurrente entre la lecture et l'écriture ;
+    # le jeton du lot identifie les lignes écrites par ce lot (et non par un autre admin au même moment)
+    batch_id = uuid.uuid4().hex
+    requests = [
+        UpdateOne({"id": reservation_id, "status": BATCH_STATUS_REQUIRED}, {"$set": {"status": status, "status_batch_id": batch_id}})
+        for reservation_id in eligible
+    ]
+    result = await db.reservations.bulk_write(requests, ordered=True, session=session)
+    if result.modified_count == len(requests):
+        return list(eligible)
+    # Quelques réservations ont changé entre-temps : on relit celles que ce lot a réellement modifiées
+    updated = set(await db.reservations.distinct(
+        "id", {"id": {"$in": list(eligible)}, "status_batch_id": batch_id}, session=session
+    ))
+    for reservation_id in eligible:
+        if reservation_id not in updated:
+            outcomes[reservation_id] = "conflict"
+    return [reservation_id for reservation_id in eligible if reservation_id in updated]
+
+
+def _report(reservation_ids: List[str], outcomes: Dict[str, str]) -> dict:
+    results = [{"id": reservation_id, "result": outcomes[reservation_id]} for reservation_id in dict.fromkeys(reservation_ids)]
+    summary: Dict[str, int] = {}
+    for item in results:
+        summary[item["result"]] = summary.get(item["result"], 0) + 1
+    return {"summary": summary, "results": results}
+
+
+async def approve_reservations(reservation_ids: List[str]) -> dict:
+    eligible, outcomes = await _load(reservation_ids)
+    if not eligible:
+        return _report(reservation_ids, outcomes)
+
+    async def write(session):
+        approved = await _apply_status(eligible, outcomes, "approved", session)
+        if not approved:
+            return approved
+        engine_ids = list({eligible[reservation_id]["engine_id"] for reservation_id in approved})
+        await db.engines.update_many({"id": {"$in": engine_ids}}, {"$set": {"status": "rented"}}, session=session)
+        now = datetime.utcnow()
+        await db.payments.insert_many([
+            {
+                "_id": ObjectId(),
+                "id": str(uuid.uuid4()),
+                "reservation_id": reservation_id,
+                "amount": eligible[reservation_id]["total_amount"],
+                "status": "pending",
+                "payment_method": "stripe",
+                "created_at": now
+            }
+            for reservation_id in approved
+        ], ordered=False, session=session)
+        return approved
+
+    approved = await run_in_transaction(write)
+    for reservation_id in approved:
+        outcomes[reservation_id] = "approved"
+
+    if approved:
+        await calendar_set_status_many(approved, "approved")
+        for engine_id in {eligible[reservation_id]["engine_id"] for reservation_id in approved}:
+            invalidate_engine(engine_id, [{"status": "rented"}])
+    return _report(reservation_ids, outcomes)
+
+
+async def reject_reservations(reservation_ids: List[str]) -> dict:
+    eligible, outcomes = await _load(reservation_ids)
+    if not eligible:
+        return _report(reservation_ids, outcomes)
+
+    rejected = await run_in_transaction(lambda session: _apply_status(eligible, outcomes, "rejected", session))
+    for reservation_id in rejected:
+        outcomes[reservation_id] = "rejected"
+
+    if rejected:
+        await release_slots_many(rejected)
+        await calendar_remove_many(rejected)
+    return _report(reservation_ids, outcomes)
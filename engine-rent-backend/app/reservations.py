@@ -1,7 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Response, status
 from app.models import Reservation, ReservationCreate, User
 from app.database import db
-from app.utils import get_current_user, get_admin_user, send_email
+from app.pagination import PageParams, page_params, fetch_page, stream_ndjson
+from app.utils import get_current_user, get_admin_user
+from app.outbox import enqueue_email
+from app.pricing import rental_days, reservation_price
+from app.cache import invalidate_engine
+from app.booking import BookingConflict, book_reservation, release_slots
+from app.availability import calendar_add, calendar_set_status, calendar_remove
 from datetime import datetime
 from bson import ObjectId
 import uuid
@@ -9,40 +15,31 @@ import uuid
 router = APIRouter(prefix="/reservations", tags=["Reservations"])
 
 @router.get("/", response_model=list[Reservation])
-async def get_reservations(current_user: User = Depends(get_current_user)):
-    if current_user.role == "admin":
-        reservations = await db.reservations.find().to_list(1000)
-    else:
-        reservations = await db.reservations.find({"user_id": current_user.id}).to_list(1000)
+async def get_reservations(
+    response: Response,
+    page: PageParams = Depends(page_params(default_limit=1000)),
+    current_user: User = Depends(get_current_user),
+):
+    query = {} if current_user.role == "admin" else {"user_id": current_user.id}
+    if page.stream:
+        return stream_ndjson(db.reservations, query, page, Reservation)
+    reservations = await fetch_page(db.reservations, query, page, response)
     return [Reservation(**r) for r in reservations]
 
 @router.post("/", response_model=Reservation)
 async def create_reservation(reservation_data: ReservationCreate, current_user: User = Depends(get_current_user)):
-    engine = await db.engines.find_one({"_id": ObjectId(reservation_data.engine_id)})
+    engine = await db.engines.find_one({"id": reservation_data.engine_id})
     if not engine:
         raise HTTPException(status_code=404, detail="Engine not found")
 
     if engine.get("status") != "available":
         raise HTTPException(status_code=400, detail="Engine is not available")
 
-    # Vérifier conflits réservations existantes sur la même période
-    conflicts = await db.reservations.find({
-        "engine_id": reservation_data.engine_id,
-        "status": {"$in": ["pending", "approved"]},
-        "$or": [
-            {"start_date": {"$lte": reservation_data.start_date}, "end_date": {"$gte": reservation_data.start_date}},
-            {"start_date": {"$lte": reservation_data.end_date}, "end_date": {"$gte": reservation_data.end_date}},
-            {"start_date": {"$gte": reservation_data.start_date}, "end_date": {"$lte": reservation_data.end_date}}
-        ]
-    }).to_list(1000)
-    if conflicts:
-        raise HTTPException(status_code=400, detail="Engine already reserved for this period")
-
-    days = (reservation_data.end_date - reservation_data.start_date).days
+    days = rental_days(reservation_data.start_date, reservation_data.end_date)
     if days <= 0:
         raise HTTPException(status_code=400, detail="Invalid reservation period")
 
-    total_amount = days * engine.get("daily_rate", 0)
+    total_amount = reservation_price(engine.get("daily_rate", 0), reservation_data.start_date, reservation_data.end_date)
 
     reservation_dict = reservation_data.dict()
     reservation_dict.update({
@@ -54,21 +51,40 @@ async def create_reservation(reservation_data: ReservationCreate, current_user:
         "created_at": datetime.utcnow()
     })
 
-    await db.reservations.insert_one(reservation_dict)
+    # Vérification des conflits et insertion atomiques (slots journaliers à index unique)
+    try:
+        await book_reservation(reservation_dict)
+    except BookingConflict:
+        raise HTTPException(status_code=400, detail="Engine already reserved for this period")
+    await calendar_add(reservation_dict)
 
     # Envoi email
-    send_email(current_user.email, "Nouvelle réservation", f"Votre réservation pour {engine['name']} a été créée. Total: {total_amount}€")
+    await enqueue_email(current_user.email, "Nouvelle réservation", f"Votre réservation pour {engine['name']} a été créée. Total: {total_amount}€")
 
     return Reservation(**reservation_dict)
 
 @router.put("/{reservation_id}/approve")
 async def approve_reservation(reservation_id: str, current_user: User = Depends(get_admin_user)):
-    reservation = await db.reservations.find_one({"id": reservation_id})
+    # Seule une réservation en attente détient encore ses slots : une réservation rejetée (slots libérés)
+    # ne peut pas redevenir active, sinon l'engin serait réservable deux fois sur les mêmes jours
+    reservation = await db.reservations.find_one_and_update(
+        {"id": reservation_id, "status": "pending"},
+        {"$set": {"status": "approved"}}
+    )
     if not reservation:
-        raise HTTPException(status_code=404, detail="Reservation not found")
-
-    await db.reservations.update_one({"id": reservation_id}, {"$set": {"status": "approved"}})
-    await db.engines.update_one({"_id": ObjectId(reservation["engine_id"])}, {"$set": {"status": "rented"}})
+        existing = await db.reservations.find_one({"id": reservation_id}, {"_id": 0, "status": 1})
+        if not existing:
+            raise HTTPException(status_code=404, detail="Reservation not found")
+        raise HTTPException(status_code=409, detail=f"Reservation is {existing['status']}, only pending reservations can be approved")
+
+    await calendar_set_status(reservation_id, "approved")
+    engine = await db.engines.find_one_and_update(
+        {"id": reservation["engine_id"]},
+        {"$set": {"status": "rented"}},
+        projection={"id": 1}
+    )
+    if engine:
+        invalidate_engine(engine["id"], [{"status": "rented"}])
 
     payment_dict = {
         "_id": ObjectId(),
@@ -89,4 +105,6 @@ async def reject_reservation(reservation_id: str, current_user: User = Depends(g
         raise HTTPException(status_code=404, detail="Reservation not found")
 
     await db.reservations.update_one({"id": reservation_id}, {"$set": {"status": "rejected"}})
+    await release_slots(reservation_id)
+    await calendar_remove(reservation_id)
     return {"message": "Reservation rejected"}
@@ -0,0 +1,196 @@
+# app/revenue.py
+# Chiffre d'affaires matérialisé : une ligne par jour et par mois dans revenue_rollups.
+# Mise à jour incrémentale quand un paiement passe à l'état encaissé ; reconstruction complète
+# par un pipeline $group (python -m app.scripts.rebuild_revenue).
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.database import db
+
+# "completed" : /payments/{id}/process ; "paid" : /api/payment/pay/{reservation_id}
+REVENUE_STATUSES = ["completed", "paid"]
+DAY, MONTH = "day", "month"
+DUPLICATE_KEY = 11000
+
+
+def _day(value: datetime) -> datetime:
+    return datetime(value.year, value.month, value.day)
+
+
+def _month(value) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def _next_month(value: datetime) -> datetime:
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def _as_datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime(value.year, value.month, value.day)
+
+
+def _day_ceil(value: datetime) -> datetime:
+    # Fin de période exclusive : un jour entamé compte en entier
+    day = _day(value)
+    return day if day == value else day + timedelta(days=1)
+
+
+# -------------------------------------
+# ➕ MISE À JOUR INCRÉMENTALE
+# -------------------------------------
+
+async def record_revenue(payment: dict):
+    # Le paiement est compté à sa date de création : la reconstruction donne le même résultat
+    created_at = payment.get("created_at") or datetime.utcnow()
+    amount = float(payment.get("amount") or 0)
+    await db.revenue_rollups.bulk_write([
+        UpdateOne(
+            {"granularity": granularity, "bucket": bucket},
+            {"$inc": {"total": amount, "count": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        for granularity, bucket in ((DAY, _day(created_at)), (MONTH, _month(created_at)))
+    ], ordered=False)
+
+
+async def mark_payment_collected(query: dict, update: dict) -> Optional[dict]:
+    # Applique la mise à jour et compte le paiement s'il n'était pas déjà encaissé
+    # (document d'avant la mise à jour : un second appel ne compte pas deux fois)
+    previous = await db.payments.find_one_and_update(query, update, projection={"_id": 0})
+    if previous and previous.get("status") not in REVENUE_STATUSES:
+        await record_revenue(previous)
+    return previous
+
+
+# -------------------------------------
+# 🔁 RECONSTRUCTION
+# -------------------------------------
+
+def daily_revenue_pipeline() -> list:
+    return [
+        {"$match": {"status": {"$in": REVENUE_STATUSES}}},
+        {"$group": {
+            "_id": {"$dateFromParts": {
+                "year": {"$year": "$created_at"},
+                "month": {"$month": "$created_at"},
+                "day": {"$dayOfMonth": "$created_at"},
+            }},
+            "total": {"$sum": "$amount"},
+            "count": {"$sum": 1},
+        }},
+    ]
+
+
+async def rebuild_revenue_rollups() -> int:
+    days = await db.payments.aggregate(daily_revenue_pipeline()).to_list(None)
+    months = {}
+    for row in days:
+        month = months.setdefault(_month(row["_id"]), {"total": 0.0, "count": 0})
+        month["total"] += row["total"]
+        month["count"] += row["count"]
+
+    now = datetime.utcnow()
+    writes = [
+        ReplaceOne(
+            {"granularity": granularity, "bucket": bucket},
+            {"granularity": granularity, "bucket": bucket, "total": float(values["total"]),
+             "count": values["count"], "updated_at": now},
+            upsert=True,
+        )
+        for granularity, rows in ((DAY, {row["_id"]: row for row in days}), (MONTH, months))
+        for bucket, values in rows.items()
+    ]
+    # Remplacement en place (upsert) : les lecteurs ne voient jamais une collection vide, et
+    # plusieurs reconstructions simultanées (démarrage de plusieurs workers) convergent
+    if writes:
+        await _upsert_all(writes)
+    # Puis suppression des agrégats qui n'existent plus (paiements supprimés ou remboursés) ;
+    # une incrémentation concurrente met updated_at à jour et n'est pas concernée
+    await db.revenue_rollups.delete_many({"updated_at": {"$lt": now}, "$or": [
+        {"granularity": DAY, "bucket": {"$nin": [row["_id"] for row in days]}},
+        {"granularity": MONTH, "bucket": {"$nin": list(months)}},
+    ]})
+    return len(writes)
+
+
+async def _upsert_all(writes: list):
+    try:
+        await db.revenue_rollups.bulk_write(writes, ordered=False)
+    except BulkWriteError as exc:
+        # Deux upserts simultanés sur une même clé : l'un échoue sur l'index unique, le rejouer
+        # trouve désormais le document et le remplace
+        errors = exc.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        await db.revenue_rollups.bulk_write([writes[error["index"]] for error in errors], ordered=False)
+
+
+async def ensure_revenue_rollups():
+    # Premier démarrage : la collection est construite à partir des paiements existants ;
+    # sans risque si plusieurs workers démarrent en même temps (reconstruction idempotente)
+    if await db.revenue_rollups.estimated_document_count() == 0:
+        await rebuild_revenue_rollups()
+
+
+# -------------------------------------
+# 📊 LECTURE
+# -------------------------------------
+
+def _period_buckets(start: datetime, end: datetime) -> dict:
+    # [start, end) = jours avant le premier mois complet + mois complets + jours restants :
+    # au plus ~62 lignes jour, quel que soit le nombre de paiements
+    start, end = _day(start), _day_ceil(end)
+    first_month = start if start.day == 1 else _next_month(start)
+    last_month = _month(end)
+    if first_month >= last_month:
+        return {"granularity": DAY, "bucket": {"$gte": start, "$lt": end}}
+    return {"$or": [
+        {"granularity": MONTH, "bucket": {"$gte": first_month, "$lt": last_month}},
+        {"granularity": DAY, "bucket": {"$gte": start, "$lt": first_month}},
+        {"granularity": DAY, "bucket": {"$gte": last_month, "$lt": end}},
+    ]}
+
+
+async def revenue_between(start, end) -> dict:
+    start, end = _as_datetime(start), _as_datetime(end)
+    if end <= start:
+        return {"total": 0.0, "count": 0}
+    rows = await db.revenue_rollups.find(_period_buckets(start, end), {"_id": 0, "total": 1, "count": 1}).to_list(None)
+    return {
+        "total": round(sum(row["total"] for row in rows), 2),
+        "count": sum(row["count"] for row in rows),
+    }
+
+
+async def revenue_series(start, end, granularity: str = DAY) -> List[dict]:
+    start, end = _day(_as_datetime(start)), _day_ceil(_as_datetime(end))
+    if granularity == MONTH:
+        start = _month(start)
+    rows = await db.revenue_rollups.find(
+        {"granularity": granularity, "bucket": {"$gte": start, "$lt": end}},
+        {"_id": 0, "bucket": 1, "total": 1, "count": 1}
+    ).sort("bucket", 1).to_list(None)
+    return [{"period": row["bucket"], "total": round(row["total"], 2), "count": row["count"]} for row in rows]
+
+
+async def revenue_overview(now: Optional[datetime] = None) -> dict:
+    now = now or datetime.utcnow()
+    today, month = _day(now), _month(now)
+    totals = await db.revenue_rollups.aggregate([
+        {"$match": {"granularity": MONTH}},
+        {"$group": {"_id": None, "total": {"$sum": "$total"}, "count": {"$sum": "$count"}}},
+    ]).to_list(1)
+    current = await db.revenue_rollups.find(
+        {"$or": [{"granularity": MONTH, "bucket": month}, {"granularity": DAY, "bucket": today}]},
+        {"_id": 0}
+    ).to_list(2)
+    by_granularity = {row["granularity"]: row for row in current}
+    return {
+        "total": round(totals[0]["total"], 2) if totals else 0.0,
+        "this_month": round(by_granularity.get(MONTH, {}).get("total", 0.0), 2),
+        "today": round(by_granularity.get(DAY, {}).get("total", 0.0), 2),
+    }
+
@@ -0,0 +1,88 @@
+# app/revocation.py
+# Liste de révocation des jetons : identifiants révoqués (jti d'un jeton ou fam d'une session)
+# gardés en mémoire et synchronisés depuis la collection revoked_tokens. La vérification à
+# chaque requête est un simple test d'appartenance, sans aller-retour MongoDB.
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from pymongo import UpdateOne
+
+from app.database import db
+
+SYNC_SECONDS = 5.0   # délai maximal avant qu'une révocation faite par un autre worker soit vue
+SYNC_OVERLAP = timedelta(seconds=30)  # relecture des dernières entrées (horloges décalées, écritures lentes)
+
+
+class RevocationList:
+    def __init__(self, sync_seconds: float = SYNC_SECONDS):
+        self.sync_seconds = sync_seconds
+        self._revoked: Dict[str, datetime] = {}   # identifiant -> expiration de la révocation
+        self._synced_until: Optional[datetime] = None
+        self._stopping = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def is_revoked(self, *identifiers: Optional[str]) -> bool:
+        return any(identifier in self._revoked for identifier in identifiers if identifier)
+
+    async def revoke(self, identifiers: Iterable[str], expires_at: datetime, reason: str = ""):
+        # Visible immédiatement dans ce worker, puis dans les autres à leur prochaine synchronisation
+        identifiers = [identifier for identifier in identifiers if identifier]
+        if not identifiers:
+            return
+        now = datetime.utcnow()
+        for identifier in identifiers:
+            self._revoked[identifier] = max(expires_at, self._revoked.get(identifier, expires_at))
+        await db.revoked_tokens.bulk_write([
+            UpdateOne(
+                {"jti": identifier},
+                {"$set": {"revoked_at": now, "reason": reason}, "$max": {"expires_at": expires_at}},
+                upsert=True,
+            )
+            for identifier in identifiers
+        ], ordered=False)
+
+    async def sync(self):
+        # Incrémental : seules les révocations postérieures à la dernière synchronisation sont lues
+        now = datetime.utcnow()
+        query = {"expires_at": {"$gt": now}}
+        if self._synced_until is not None:
+            query["revoked_at"] = {"$gte": self._synced_until - SYNC_OVERLAP}
+        async for entry in db.revoked_tokens.find(query, {"_id": 0, "jti": 1, "expires_at": 1, "revoked_at": 1}):
+            self._revoked[entry["jti"]] = entry["expires_at"]
+            if self._synced_until is None or entry["revoked_at"] > self._synced_until:
+                self._synced_until = entry["revoked_at"]
+        if self._synced_until is None:
+            self._synced_until = now
+        # Un jeton expiré est refusé de toute façon : sa révocation peut être oubliée
+        for identifier in [i for i, expires_at in self._revoked.items() if expires_at <= now]:
+            del self._revoked[identifier]
+
+    async def start(self):
+        await self.sync()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            await self._task
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.sync_seconds)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping.is_set():
+                break
+            try:
+                await self.sync()
+            except Exception as exc:
+                print(f"🔑 Révocations : synchronisation impossible ({exc})")
+
+
+revocation_list = RevocationList()
@@ -1,17 +1,31 @@
 # app/routes/admin.py
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from typing import List, Literal, Optional
+from datetime import datetime
 from bson import ObjectId
-from app.models import User
-from app.utils import get_password_hash
+from app.models import User, ReservationBatch, MaintenanceScheduleBatch
+from app.passwords import password_hasher
 from app.database import db
 from app.dependencies import require_roles
+from app.pagination import PageParams, page_params, fetch_page, stream_ndjson
+from app.booking import BookingConflict, release_slots
+from app.availability import calendar_set_status, calendar_remove
+from app.reservation_batch import approve_reservations, reject_reservations
+from app.invoices import export_invoices_zip
+from app.revenue import REVENUE_STATUSES
+from app.cache import invalidate_user
+from app.tokens import revoke_user_sessions
+from app.utils import is_account_active
+from app.dashboard import dashboard_snapshot
+from app.fleet_analytics import analytics_period, fleet_utilization
+from app.live import sse_stream
+from app.maintenance_scheduler import release_maintenance_slots, schedule_maintenances, sync_maintenance_slots
 
 # Collections MongoDB
 from app.database import (
     users_collection as users,
-    engines_collection as engines,
     reservations_collection as reservations,
     maintenances_collection as maintenances
 )
@@ -21,29 +35,89 @@ router = APIRouter(prefix="/api/admin", tags=["Admin"])
 # --- Dashboard stats
 @router.get("/dashboard/stats")
 async def get_dashboard_stats(admin=Depends(require_roles(["admin"]))):
-    total_users = await users.count_documents({})
-    total_engines = await engines.count_documents({})
-    total_reservations = await reservations.count_documents({})
+    snapshot = await dashboard_snapshot.get()
     return {
-        "users": total_users,
-        "engines": total_engines,
-        "reservations": total_reservations
+        "users": snapshot["users"]["total"],
+        "engines": snapshot["engines"]["total"],
+        "reservations": snapshot["reservations"]["total"]
     }
 
+# --- Métriques du hachage des mots de passe (file d'attente bcrypt)
+@router.get("/metrics/password-hashing")
+async def get_password_hashing_metrics(admin=Depends(require_roles(["admin"]))):
+    return password_hasher.stats()
+
+# --- Flux temps réel (SSE) : deltas des réservations, paiements, engins et tickets
+@router.get("/live")
+async def live_updates(request: Request, admin=Depends(require_roles(["admin"]))):
+    return StreamingResponse(sse_stream(request), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+# --- Taux d'utilisation de la flotte (par catégorie et par engin)
+@router.get("/analytics/utilization")
+async def get_fleet_utilization(
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    category: Optional[str] = None,
+    sort: Literal["utilization", "idle", "revenue"] = "utilization",
+    order: Literal["asc", "desc"] = "asc",
+    limit: int = Query(100, ge=1, le=10000),
+    admin=Depends(require_roles(["admin"]))
+):
+    start, end = analytics_period(date_from, date_to)
+    fleet = await fleet_utilization(start, end)
+    return {
+        "from": start,
+        "to": end,
+        "categories": fleet.category_summary(),
+        "engines": fleet.engine_rows(category, sort, order == "desc", limit)
+    }
+
+@router.get("/analytics/utilization/{engine_id}")
+async def get_engine_utilization(
+    engine_id: str,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    admin=Depends(require_roles(["admin"]))
+):
+    start, end = analytics_period(date_from, date_to)
+    detail = (await fleet_utilization(start, end)).engine_detail(engine_id)
+    if detail is None:
+        raise HTTPException(status_code=404, detail="Engin non trouvé")
+    return {"from": start, "to": end, **detail}
+
 # --- Réservations en attente
 @router.get("/reservations/pending")
-async def get_pending_reservations(admin=Depends(require_roles(["admin"]))):
-    return await reservations.find({"status": "pending"}).to_list(100)
+async def get_pending_reservations(response: Response, page: PageParams = Depends(page_params()), admin=Depends(require_roles(["admin"]))):
+    if page.stream:
+        return stream_ndjson(reservations, {"status": "pending"}, page)
+    return await fetch_page(reservations, {"status": "pending"}, page, response)
+
+# --- Approuver / rejeter un lot de réservations
+@router.post("/reservations/batch/approve")
+async def batch_approve_reservations(batch: ReservationBatch, admin=Depends(require_roles(["admin"]))):
+    return await approve_reservations(batch.ids)
+
+@router.post("/reservations/batch/reject")
+async def batch_reject_reservations(batch: ReservationBatch, admin=Depends(require_roles(["admin"]))):
+    return await reject_reservations(batch.ids)
 
 # --- Approuver une réservation
 @router.put("/reservations/{reservation_id}/approve")
 async def approve_reservation(reservation_id: str, admin=Depends(require_roles(["admin"]))):
+    # Uniquement depuis "pending" : une réservation rejetée a déjà libéré ses slots
     result = await reservations.update_one(
-        {"id": reservation_id},
+        {"id": reservation_id, "status": "pending"},
         {"$set": {"status": "approved"}}
     )
     if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Réservation non trouvée")
+        existing = await reservations.find_one({"id": reservation_id}, {"_id": 0, "status": 1})
+        if not existing:
+            raise HTTPException(status_code=404, detail="Réservation non trouvée")
+        raise HTTPException(status_code=409, detail=f"Réservation {existing['status']} : seule une réservation en attente peut être approuvée")
+    await calendar_set_status(reservation_id, "approved")
     return {"message": "Réservation approuvée"}
 
 # --- Rejeter une réservation
@@ -55,12 +129,34 @@ async def reject_reservation(reservation_id: str, admin=Depends(require_roles(["
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Réservation non trouvée")
+    await release_slots(reservation_id)
+    await calendar_remove(reservation_id)
     return {"message": "Réservation rejetée"}
 
+# --- Export groupé des factures (ZIP streamé)
+@router.get("/invoices/export")
+async def export_invoices(
+    date_from: datetime,
+    date_to: datetime,
+    payment_status: Optional[str] = Query(None, alias="status"),
+    admin=Depends(require_roles(["admin"]))
+):
+    if date_from >= date_to:
+        raise HTTPException(status_code=400, detail="La date de fin doit être postérieure à la date de début")
+    query = {"created_at": {"$gte": date_from, "$lt": date_to}}
+    # Par défaut, tous les paiements encaissés ("completed" via /process, "paid" via /pay)
+    query["status"] = payment_status or {"$in": REVENUE_STATUSES}
+    filename = f"factures_{date_from:%Y%m%d}_{date_to:%Y%m%d}.zip"
+    return StreamingResponse(export_invoices_zip(query), media_type="application/zip", headers={
+        "Content-Disposition": f"attachment; filename={filename}"
+    })
+
 # --- Obtenir tous les utilisateurs
 @router.get("/users", response_model=List[User])
-async def get_all_users(admin=Depends(require_roles(["admin"]))):
-    return await users.find().to_list(100)
+async def get_all_users(response: Response, page: PageParams = Depends(page_params()), admin=Depends(require_roles(["admin"]))):
+    if page.stream:
+        return stream_ndjson(users, {}, page, User)
+    return await fetch_page(users, {}, page, response)
 
 # --- Créer un nouvel utilisateur
 @router.post("/users", status_code=status.HTTP_201_CREATED)
@@ -69,7 +165,7 @@ async def create_user(user_data: User, admin=Depends(require_roles(["admin"]))):
     if existing_user:
         raise HTTPException(status_code=400, detail="Email déjà utilisé")
 
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     user_dict = user_data.dict()
     user_dict["password"] = hashed_password
     user_dict["is_verified"] = False
@@ -85,8 +181,13 @@ async def toggle_user_verification(user_id: str, admin=Depends(require_roles(["a
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
 
-    new_status = not user.get("is_verified", False)
+    # Même règle que l'authentification : un compte sans is_verified est actif, le basculer le désactive
+    new_status = not is_account_active(user)
     await users.update_one({"id": user_id}, {"$set": {"is_verified": new_status}})
+    invalidate_user(user_id)
+    if not new_status:
+        # Les jetons déjà délivrés cessent d'être acceptés (synchronisation des autres workers en quelques secondes)
+        await revoke_user_sessions(user_id, reason="deactivated")
     return {"message": f"Utilisateur {'activé' if new_status else 'désactivé'} avec succès"}
 
 # --- Supprimer un utilisateur
@@ -95,12 +196,16 @@ async def delete_user(user_id: str, admin=Depends(require_roles(["admin"]))):
     result = await users.delete_one({"id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+    invalidate_user(user_id)
+    await revoke_user_sessions(user_id, reason="deleted")
     return {"message": "Utilisateur supprimé avec succès"}
 
 # --- Liste des maintenances
 @router.get("/maintenances")
-async def get_all_maintenances(admin=Depends(require_roles(["admin"]))):
-    return await maintenances.find().to_list(100)
+async def get_all_maintenances(response: Response, page: PageParams = Depends(page_params()), admin=Depends(require_roles(["admin"]))):
+    if page.stream:
+        return stream_ndjson(maintenances, {}, page)
+    return await fetch_page(maintenances, {}, page, response)
 
 # --- Ajouter une maintenance
 @router.post("/maintenances")
@@ -109,9 +214,21 @@ async def create_maintenance(data: dict, admin=Depends(require_roles(["admin"]))
     await maintenances.insert_one(data)
     return {"message": "Maintenance ajoutée avec succès"}
 
+# --- Planification groupée : premier créneau libre par engin avant l'échéance
+@router.post("/maintenances/schedule")
+async def schedule_maintenance_batch(batch: MaintenanceScheduleBatch, admin=Depends(require_roles(["admin"]))):
+    return await schedule_maintenances(batch.requests, dry_run=batch.dry_run)
+
 # --- Modifier une maintenance
 @router.put("/maintenances/{maintenance_id}")
 async def update_maintenance(maintenance_id: str, data: dict, admin=Depends(require_roles(["admin"]))):
+    maintenance = await maintenances.find_one({"id": maintenance_id}, {"_id": 0})
+    if not maintenance:
+        raise HTTPException(status_code=404, detail="Maintenance non trouvée")
+    try:
+        data = await sync_maintenance_slots(maintenance, data)
+    except BookingConflict:
+        raise HTTPException(status_code=409, detail="Engin déjà réservé sur ces jours")
     result = await maintenances.update_one({"id": maintenance_id}, {"$set": data})
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Maintenance non trouvée")
@@ -124,6 +241,13 @@ async def update_maintenance_status(maintenance_id: str, status_update: dict, ad
     if not new_status:
         raise HTTPException(status_code=400, detail="Nouveau statut requis")
 
+    maintenance = await db.maintenances.find_one({"id": maintenance_id}, {"_id": 0})
+    if not maintenance:
+        raise HTTPException(status_code=404, detail="Maintenance non trouvée")
+    try:
+        await sync_maintenance_slots(maintenance, {"status": new_status})
+    except BookingConflict:
+        raise HTTPException(status_code=409, detail="Engin déjà réservé sur ces jours")
     result = await db.maintenances.update_one(
         {"id": maintenance_id},
         {"$set": {"status": new_status}}
@@ -138,12 +262,15 @@ async def delete_maintenance(maintenance_id: str, admin=Depends(require_roles(["
     result = await maintenances.delete_one({"id": maintenance_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Maintenance non trouvée")
+    await release_maintenance_slots(maintenance_id)
     return {"message": "Maintenance supprimée"}
 
 # --- Support : récupérer tous les tickets
 @router.get("/support-tickets")
-async def get_all_tickets(admin=Depends(require_roles(["admin"]))):
-    tickets = await db.support_tickets.find().to_list(100)
+async def get_all_tickets(response: Response, page: PageParams = Depends(page_params()), admin=Depends(require_roles(["admin"]))):
+    if page.stream:
+        return stream_ndjson(db.support_tickets, {}, page)
+    tickets = await fetch_page(db.support_tickets, {}, page, response)
     return tickets
 
 # --- Support : changer le statut d’un ticket
@@ -166,8 +293,10 @@ async def delete_ticket(ticket_id: str, admin=Depends(require_roles(["admin"])))
 
 # --- Lister tous les feedbacks
 @router.get("/feedbacks")
-async def list_feedbacks(admin=Depends(require_roles(["admin"]))):
-    feedbacks = await db.feedbacks.find().to_list(100)
+async def list_feedbacks(response: Response, page: PageParams = Depends(page_params()), admin=Depends(require_roles(["admin"]))):
+    if page.stream:
+        return stream_ndjson(db.feedbacks, {}, page)
+    feedbacks = await fetch_page(db.feedbacks, {}, page, response)
     return feedbacks
 
 # --- Supprimer un feedback
@@ -1,9 +1,12 @@
 # app/routes/maintenance.py
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from app.utils import get_current_user, get_admin_user
 from app.models import MaintenanceCreate, Maintenance
 from app.database import db
+from app.pagination import PageParams, page_params, fetch_page, stream_ndjson
+from app.cache import invalidate_engine
+from app.maintenance_scheduler import release_maintenance_slots
 from datetime import datetime
 from uuid import uuid4
 
@@ -25,14 +28,16 @@ async def schedule_maintenance(data: MaintenanceCreate, admin=Depends(get_admin_
         {"id": data.engine_id},
         {"$set": {"status": "maintenance"}}
     )
+    invalidate_engine(data.engine_id, [{"status": "maintenance"}])
 
     return {"message": "Maintenance planifiée", "id": maintenance_id}
 
 # ✅ Liste des maintenances
 @router.get("/")
-async def list_maintenances(user=Depends(get_current_user)):
-    maintenances = await db.maintenances.find({}).to_list(100)
-    return maintenances
+async def list_maintenances(response: Response, page: PageParams = Depends(page_params()), user=Depends(get_current_user)):
+    if page.stream:
+        return stream_ndjson(db.maintenances, {}, page)
+    return await fetch_page(db.maintenances, {}, page, response)
 
 # ✅ Terminer une maintenance
 @router.patch("/{maintenance_id}/complete")
@@ -52,9 +57,11 @@ async def complete_maintenance(maintenance_id: str, user=Depends(get_current_use
         }}
     )
 
+    await release_maintenance_slots(maintenance_id)
     await db.engines.update_one(
         {"id": maintenance["engine_id"]},
         {"$set": {"status": "available"}}
     )
+    invalidate_engine(maintenance["engine_id"], [{"status": "available"}])
 
     return {"message": "Maintenance terminée"}
@@ -1,8 +1,14 @@
 # app/routes/payment.py
 
-from fastapi import APIRouter, Depends, HTTPException
-from app.utils import get_current_user, send_email
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from typing import Optional
+from app.utils import get_current_user
+from app.outbox import enqueue_email
 from app.database import db
+from app.pagination import PageParams, page_params, fetch_page, stream_ndjson
+from app.availability import calendar_set_status
+from app.revenue import record_revenue
+from app.idempotency import IDEMPOTENCY_HEADER, run_idempotent
 from app.models import Payment
 from datetime import datetime
 from uuid import uuid4
@@ -10,12 +16,24 @@ from uuid import uuid4
 router = APIRouter(prefix="/api/payment", tags=["Paiement"])
 
 @router.get("/")
-async def get_user_payments(user=Depends(get_current_user)):
-    payments = await db.payments.find({"user_id": user.id}).to_list(100)
-    return payments
+async def get_user_payments(response: Response, page: PageParams = Depends(page_params()), user=Depends(get_current_user)):
+    if page.stream:
+        return stream_ndjson(db.payments, {"user_id": user.id}, page)
+    return await fetch_page(db.payments, {"user_id": user.id}, page, response)
 
 @router.post("/pay/{reservation_id}")
-async def pay_for_reservation(reservation_id: str, user=Depends(get_current_user)):
+async def pay_for_reservation(
+    reservation_id: str,
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+    user=Depends(get_current_user),
+):
+    # Un client qui rejoue la même clé reçoit la réponse initiale : pas de second paiement ni d'email
+    return await run_idempotent(
+        idempotency_key, user.id, f"POST /api/payment/pay/{reservation_id}",
+        lambda: _pay_for_reservation(reservation_id, user)
+    )
+
+async def _pay_for_reservation(reservation_id: str, user):
     reservation = await db.reservations.find_one({"id": reservation_id, "user_id": user.id})
     if not reservation:
         raise HTTPException(status_code=404, detail="Réservation non trouvée")
@@ -40,13 +58,15 @@ async def pay_for_reservation(reservation_id: str, user=Depends(get_current_user
     }
 
     await db.payments.insert_one(payment)
+    await record_revenue(payment)
 
     await db.reservations.update_one(
         {"id": reservation_id},
         {"$set": {"status": "paid"}}
     )
+    await calendar_set_status(reservation_id, "paid")
 
-    send_email(
+    await enqueue_email(
         to_email=user.email,
         subject="Paiement reçu",
         body=f"Merci pour votre paiement de {amount} €. Transaction : {transaction_id}"
@@ -1,9 +1,10 @@
 # app/routes/support.py
 
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Response
 from app.utils import get_current_user, get_admin_user
 from app.models import SupportTicketCreate, SupportTicket
 from app.database import db
+from app.pagination import PageParams, page_params, fetch_page, stream_ndjson
 from datetime import datetime
 from uuid import uuid4
 
@@ -26,15 +27,17 @@ async def create_ticket(data: SupportTicketCreate, user=Depends(get_current_user
 
 # ✅ Voir ses propres tickets
 @router.get("/my")
-async def get_my_tickets(user=Depends(get_current_user)):
-    tickets = await db.support_tickets.find({"user_id": user.id}).to_list(100)
-    return tickets
+async def get_my_tickets(response: Response, page: PageParams = Depends(page_params()), user=Depends(get_current_user)):
+    if page.stream:
+        return stream_ndjson(db.support_tickets, {"user_id": user.id}, page)
+    return await fetch_page(db.support_tickets, {"user_id": user.id}, page, response)
 
 # ✅ Voir tous les tickets (admin)
 @router.get("/")
-async def get_all_tickets(admin=Depends(get_admin_user)):
-    tickets = await db.support_tickets.find({}).to_list(100)
-    return tickets
+async def get_all_tickets(response: Response, page: PageParams = Depends(page_params()), admin=Depends(get_admin_user)):
+    if page.stream:
+        return stream_ndjson(db.support_tickets, {}, page)
+    return await fetch_page(db.support_tickets, {}, page, response)
 
 # ✅ Marquer un ticket comme résolu
 @router.patch("/{ticket_id}/resolve")
@@ -0,0 +1,88 @@
+# bench_auth.py
+# Débit des requêtes authentifiées (get_current_user) avec et sans le cache utilisateur.
+# Les requêtes passent par la pile ASGI complète (httpx, sans réseau) et une vraie base MongoDB :
+#   MONGODB_URI=mongodb://localhost:27017 python -m app.scripts.bench_auth --requests 5000 --concurrency 50
+import argparse
+import asyncio
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+from fastapi import Depends, FastAPI
+
+from app.cache import USER_CACHE_TTL, user_cache
+from app.database import db
+from app.models import User
+from app.utils import create_access_token, get_current_user
+
+
+def bench_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/me")
+    async def me(current_user: User = Depends(get_current_user)):
+        return {"id": current_user.id}
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, tokens: list, requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(i: int):
+        async with semaphore:
+            response = await client.get("/me", headers={"Authorization": f"Bearer {tokens[i % len(tokens)]}"})
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(requests)))
+    return requests / (time.perf_counter() - started)
+
+
+async def run(requests: int, concurrency: int, users: int):
+    run_id = f"bench-{uuid.uuid4()}"
+    user_ids = [f"{run_id}-{i}" for i in range(users)]
+    await db.users.insert_many([
+        {
+            "id": user_id,
+            "email": f"{user_id}@example.com",
+            "name": "Bench",
+            "role": "client",
+            "password": "x",
+            "is_verified": True,
+            "created_at": datetime.utcnow(),
+        }
+        for user_id in user_ids
+    ])
+    tokens = [create_access_token({"sub": user_id}) for user_id in user_ids]
+    transport = httpx.ASGITransport(app=bench_app())
+    results = {}
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for label, ttl in (("sans cache", 0), ("avec cache", USER_CACHE_TTL or 30)):
+                user_cache.ttl = ttl
+                user_cache.clear()
+                await measure(client, tokens, min(requests, 200), concurrency)  # échauffement
+                results[label] = await measure(client, tokens, requests, concurrency)
+    finally:
+        user_cache.ttl = USER_CACHE_TTL
+        await db.users.delete_many({"id": {"$in": user_ids}})
+
+    print(f"Requêtes     : {requests} (concurrence {concurrency}, {users} utilisateurs)")
+    for label, throughput in results.items():
+        print(f"{label:<12} : {throughput:.0f} requêtes/s")
+    print(f"Gain         : x{results['avec cache'] / results['sans cache']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des requêtes authentifiées avec / sans cache utilisateur")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency, args.users))
+
+
+if __name__ == "__main__":
+    main()
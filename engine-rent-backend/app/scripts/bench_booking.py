@@ -0,0 +1,81 @@
+# bench_booking.py
+# Benchmark de contention : beaucoup de réservations concurrentes sur UN seul engin.
+# Vérifie qu'aucune double réservation n'est acceptée et mesure le débit.
+#   MONGODB_URI=mongodb://localhost:27017 python -m app.scripts.bench_booking --requests 2000 --concurrency 100
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from app.booking import BookingConflict, book_reservation
+from app.database import db, ensure_indexes
+
+
+async def run(requests: int, concurrency: int, window_days: int, max_length: int, seed: int):
+    await ensure_indexes()
+    rng = random.Random(seed)
+    engine_id = f"bench-{uuid.uuid4()}"
+    origin = datetime(2030, 1, 1)
+    semaphore = asyncio.Semaphore(concurrency)
+    outcomes = {"booked": 0, "conflict": 0}
+
+    async def attempt():
+        start = origin + timedelta(days=rng.randrange(window_days), hours=rng.choice([0, 8, 14]))
+        end = start + timedelta(days=rng.randint(1, max_length))
+        reservation = {
+            "id": str(uuid.uuid4()),
+            "engine_id": engine_id,
+            "user_id": "bench",
+            "start_date": start,
+            "end_date": end,
+            "total_amount": 0,
+            "status": "pending",
+            "created_at": datetime.utcnow(),
+        }
+        async with semaphore:
+            try:
+                await book_reservation(reservation)
+                outcomes["booked"] += 1
+            except BookingConflict:
+                outcomes["conflict"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(attempt() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    # Contrôle : aucune paire de réservations acceptées ne doit se chevaucher
+    booked = await db.reservations.find({"engine_id": engine_id}).sort("start_date", 1).to_list(None)
+    double_bookings, latest_end = 0, None
+    for reservation in booked:
+        if latest_end is not None and reservation["start_date"] < latest_end:
+            double_bookings += 1
+        latest_end = max(latest_end or reservation["end_date"], reservation["end_date"])
+
+    await db.reservations.delete_many({"engine_id": engine_id})
+    await db.reservation_slots.delete_many({"engine_id": engine_id})
+
+    print(f"Requêtes            : {requests} (concurrence {concurrency})")
+    print(f"Acceptées           : {outcomes['booked']}")
+    print(f"Refusées (conflit)  : {outcomes['conflict']}")
+    print(f"Double réservations : {double_bookings}")
+    print(f"Durée               : {elapsed:.2f}s")
+    print(f"Débit               : {requests / elapsed:.0f} tentatives/s")
+    return double_bookings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de réservation concurrente sur un engin")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--window-days", type=int, default=365)
+    parser.add_argument("--max-length", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    double_bookings = asyncio.run(run(args.requests, args.concurrency, args.window_days, args.max_length, args.seed))
+    raise SystemExit(1 if double_bookings else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# bench_fleet_analytics.py
+# Temps du calcul vectorisé d'utilisation sur une flotte synthétique (sans base de données) :
+#   python -m app.scripts.bench_fleet_analytics --engines 10000 --days 1096
+import argparse
+import time
+
+import numpy as np
+
+from app.fleet_analytics import compute_utilization
+
+
+def synthetic_intervals(rng, n_engines: int, n_days: int, per_engine: int, max_length: int) -> dict:
+    count = n_engines * per_engine
+    first = rng.integers(0, n_days, count)
+    return {
+        "rows": np.repeat(np.arange(n_engines), per_engine),
+        "first": first,
+        "last": np.minimum(first + rng.integers(1, max_length, count), n_days),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du calcul d'utilisation de la flotte")
+    parser.add_argument("--engines", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=1096)
+    parser.add_argument("--reservations-per-engine", type=int, default=50)
+    parser.add_argument("--maintenances-per-engine", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    reservations = synthetic_intervals(rng, args.engines, args.days, args.reservations_per_engine, 15)
+    reservations["daily_revenue"] = rng.uniform(50, 500, len(reservations["rows"]))
+    maintenances = synthetic_intervals(rng, args.engines, args.days, args.maintenances_per_engine, 4)
+    month_offsets = list(range(0, args.days, 30))
+
+    started = time.perf_counter()
+    metrics = compute_utilization(args.engines, args.days, month_offsets, reservations, maintenances)
+    elapsed = time.perf_counter() - started
+
+    utilization = metrics["rented_days"] / np.maximum(metrics["available_days"], 1)
+    print(f"Flotte         : {args.engines} engins × {args.days} jours")
+    print(f"Réservations   : {len(reservations['rows'])}, maintenances : {len(maintenances['rows'])}")
+    print(f"Utilisation    : moyenne {utilization.mean():.1%}, médiane {np.median(utilization):.1%}")
+    print(f"Inactivité max : {int(metrics['longest_idle'].max())} jours")
+    print(f"Durée          : {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
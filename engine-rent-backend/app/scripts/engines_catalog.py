@@ -0,0 +1,55 @@
+# engines_catalog.py
+# Import / export en masse du catalogue depuis la ligne de commande :
+#   python -m app.scripts.engines_catalog import flotte.csv
+#   python -m app.scripts.engines_catalog export engines.ndjson --format ndjson
+import argparse
+import asyncio
+import json
+import sys
+
+from app.catalog_io import FORMATS, IMPORT_BATCH_SIZE, iter_rows, import_engines, export_engines
+
+
+def _guess_format(path: str) -> str:
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+async def run_import(path: str, fmt: str, batch_size: int):
+    with open(path, encoding="utf-8-sig", newline="") as stream:
+        report = await import_engines(iter_rows(stream, fmt), batch_size=batch_size)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return report
+
+
+async def run_export(path: str, fmt: str):
+    if path == "-":
+        # La sortie standard appartient au processus : on écrit dedans sans la fermer
+        await _write_export(sys.stdout.buffer, fmt)
+        sys.stdout.buffer.flush()
+        return
+    with open(path, "wb") as out:
+        await _write_export(out, fmt)
+
+
+async def _write_export(out, fmt: str):
+    async for chunk in export_engines(fmt):
+        out.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import / export du catalogue d'engins")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("path", help="Fichier source ou destination ('-' pour la sortie standard)")
+    parser.add_argument("--format", choices=FORMATS, default=None)
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    fmt = args.format or _guess_format(args.path)
+    if args.action == "import":
+        report = asyncio.run(run_import(args.path, fmt, args.batch_size))
+        sys.exit(1 if report["failed"] else 0)
+    asyncio.run(run_export(args.path, fmt))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+# migrate_reservation_engine_ids.py
+# Réécrit engine_id des réservations et des slots créés avec l'_id Mongo de l'engin vers son id public :
+#   python -m app.scripts.migrate_reservation_engine_ids
+import asyncio
+import json
+
+from app.availability import migrate_reservation_engine_ids
+
+
+def main():
+    report = asyncio.run(migrate_reservation_engine_ids())
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+# rebuild_revenue.py
+# Reconstruit les agrégats de chiffre d'affaires (jour / mois) à partir de la collection payments :
+#   python -m app.scripts.rebuild_revenue
+import asyncio
+
+from app.revenue import rebuild_revenue_rollups
+
+
+def main():
+    buckets = asyncio.run(rebuild_revenue_rollups())
+    print(f"✅ {buckets} agrégats de chiffre d'affaires reconstruits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# reconcile_payments.py
+# Rapprochement réservations / paiements (merge-join en flux, reprise possible) :
+#   python -m app.scripts.reconcile_payments --report ecarts.ndjson
+#   python -m app.scripts.reconcile_payments --resume <run_id> --report ecarts.ndjson
+import argparse
+import asyncio
+import json
+import time
+
+from app.reconciliation import reconcile
+
+
+async def run(run_id, report_path):
+    started = time.perf_counter()
+    # En reprise, le rapport existant est complété
+    mode = "a" if run_id else "w"
+    if report_path:
+        with open(report_path, mode, encoding="utf-8") as report:
+            result = await reconcile(run_id, report)
+    else:
+        result = await reconcile(run_id)
+    result["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(result, indent=2, default=str, ensure_ascii=False))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rapprochement des réservations et des paiements")
+    parser.add_argument("--resume", metavar="RUN_ID", default=None, help="Reprendre une exécution interrompue")
+    parser.add_argument("--report", default=None, help="Fichier NDJSON des écarts")
+    args = parser.parse_args()
+    result = asyncio.run(run(args.resume, args.report))
+    raise SystemExit(1 if result["counters"]["mismatches"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# app/search.py
+# Index inversé en mémoire pour la recherche plein texte du catalogue d'engins
+import asyncio
+import math
+import re
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+from app.database import db
+
+# Poids des champs indexés (le nom compte plus que la description)
+FIELD_WEIGHTS = {"name": 3.0, "brand": 2.0, "category": 2.0, "description": 1.0}
+
+# Paramètres BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Un terme trouvé par préfixe ("pell" -> "pelleteuse") compte moins qu'un terme exact
+PREFIX_WEIGHT = 0.6
+
+# Les autres workers écrivent aussi dans le catalogue : chaque écriture incrémente une version
+# partagée (collection catalog_state), relue au plus toutes les VERSION_CHECK_SECONDS ; l'index
+# est rechargé dès qu'elle a changé
+VERSION_CHECK_SECONDS = 2.0
+CATALOG_VERSION_ID = "engines"
+
+STOP_WORDS = {
+    "a", "au", "aux", "de", "des", "du", "en", "et", "la", "le", "les",
+    "l", "d", "un", "une", "pour", "par", "sur", "avec", "the", "and", "for",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold(text: str) -> str:
+    # "Élévatrice" -> "elevatrice", "Œuvre" -> "oeuvre"
+    text = text.replace("œ", "oe").replace("Œ", "oe").replace("æ", "ae").replace("Æ", "ae")
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+async def _catalog_version() -> int:
+    state = await db.catalog_state.find_one({"_id": CATALOG_VERSION_ID}, {"version": 1})
+    return state["version"] if state else 0
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [t for t in _TOKEN_RE.findall(fold(text)) if t not in STOP_WORDS]
+
+
+class EngineSearchIndex:
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)  # terme -> {engine_id: tf pondéré}
+        self._doc_terms: Dict[str, Set[str]] = {}
+        self._doc_len: Dict[str, float] = {}
+        self._total_len = 0.0
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+        self._version: Optional[int] = None
+        self._checked_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _is_current(self) -> bool:
+        return self._checked_at is not None and time.monotonic() - self._checked_at < VERSION_CHECK_SECONDS
+
+    async def ensure_loaded(self):
+        if self._is_current():
+            return
+        async with self._lock:
+            if self._is_current():
+                return
+            # Version lue avant le chargement : une écriture pendant le chargement provoquera un rechargement
+            version = await _catalog_version()
+            if version != self._version:
+                fresh = EngineSearchIndex()
+                projection = {"_id": 0, "id": 1, **{field: 1 for field in FIELD_WEIGHTS}}
+                async for engine in db.engines.find({}, projection):
+                    fresh.add(engine)
+                self._postings = fresh._postings
+                self._doc_terms = fresh._doc_terms
+                self._doc_len = fresh._doc_len
+                self._total_len = fresh._total_len
+                self._vocabulary_dirty = True
+                self._version = version
+            self._checked_at = time.monotonic()
+
+    async def record_change(self):
+        # À appeler après une écriture du catalogue (déjà appliquée localement par add / remove) :
+        # les autres workers rechargeront leur index à leur prochaine vérification
+        state = await db.catalog_state.find_one_and_update(
+            {"_id": CATALOG_VERSION_ID}, {"$inc": {"version": 1}}, upsert=True, return_document=True
+        )
+        if self._version is not None and state["version"] == self._version + 1:
+            self._version = state["version"]   # aucune autre écriture entre-temps : l'index local est à jour
+
+    def invalidate(self):
+        # Force un rechargement complet au prochain appel (après un import en masse par exemple)
+        self._version = None
+        self._checked_at = None
+
+    def add(self, engine: dict):
+        engine_id = engine["id"]
+        self.remove(engine_id)
+
+        weighted_tf: Dict[str, float] = defaultdict(float)
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(engine.get(field)):
+                weighted_tf[term] += weight
+                length += weight
+
+        for term, tf in weighted_tf.items():
+            if term not in self._postings:
+                self._vocabulary_dirty = True
+            self._postings[term][engine_id] = tf
+        self._doc_terms[engine_id] = set(weighted_tf)
+        self._doc_len[engine_id] = length
+        self._total_len += length
+
+    def remove(self, engine_id: str):
+        terms = self._doc_terms.pop(engine_id, None)
+        if terms is None:
+            return
+        self._total_len -= self._doc_len.pop(engine_id, 0.0)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(engine_id, None)
+            if not postings:
+                del self._postings[term]
+                self._vocabulary_dirty = True
+
+    def _expand(self, token: str) -> Dict[str, float]:
+        # Termes du vocabulaire commençant par le token (recherche dichotomique)
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        expansions = {}
+        i = bisect_left(self._vocabulary, token)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(token):
+            term = self._vocabulary[i]
+            expansions[term] = 1.0 if term == token else PREFIX_WEIGHT
+            i += 1
+        return expansions
+
+    def search(self, text: str) -> List[str]:
+        # Retourne les ids d'engins contenant tous les mots (ou leurs préfixes), triés par pertinence
+        tokens = list(dict.fromkeys(tokenize(text)))
+        if not tokens or not self._doc_terms:
+            return []
+
+        n_docs = len(self._doc_terms)
+        avg_len = self._total_len / n_docs if n_docs else 1.0
+        scores: Optional[Dict[str, float]] = None
+
+        for token in tokens:
+            token_scores: Dict[str, float] = defaultdict(float)
+            for term, boost in self._expand(token).items():
+                postings = self._postings[term]
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for engine_id, tf in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_len[engine_id] / avg_len)
+                    token_scores[engine_id] = max(
+                        token_scores[engine_id],
+                        boost * idf * tf * (BM25_K1 + 1) / (tf + norm),
+                    )
+
+            if scores is None:
+                scores = dict(token_scores)
+            else:
+                scores = {eid: s + token_scores[eid] for eid, s in scores.items() if eid in token_scores}
+            if not scores:
+                return []
+
+        return sorted(scores, key=lambda eid: (-scores[eid], eid))
+
+
+search_index = EngineSearchIndex()
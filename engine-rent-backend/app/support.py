@@ -1,7 +1,8 @@
 # app/support.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from app.models import SupportTicket, SupportTicketCreate, User
 from app.database import db
+from app.pagination import PageParams, page_params, fetch_page, stream_ndjson
 from app.utils import get_current_user
 from datetime import datetime
 import uuid
@@ -9,11 +10,15 @@ import uuid
 router = APIRouter(prefix="/support/tickets", tags=["Support"])
 
 @router.get("/", response_model=list[SupportTicket])
-async def get_support_tickets(current_user: User = Depends(get_current_user)):
-    if current_user.role == "admin":
-        tickets = await db.support_tickets.find().to_list(1000)
-    else:
-        tickets = await db.support_tickets.find({"user_id": current_user.id}).to_list(1000)
+async def get_support_tickets(
+    response: Response,
+    page: PageParams = Depends(page_params(default_limit=1000)),
+    current_user: User = Depends(get_current_user),
+):
+    query = {} if current_user.role == "admin" else {"user_id": current_user.id}
+    if page.stream:
+        return stream_ndjson(db.support_tickets, query, page, SupportTicket)
+    tickets = await fetch_page(db.support_tickets, query, page, response)
     return [SupportTicket(**t) for t in tickets]
 
 @router.post("/", response_model=SupportTicket)
@@ -0,0 +1,96 @@
+# app/tokens.py
+# Jetons d'accès courts + jetons de rafraîchissement à rotation. Chaque connexion ouvre une
+# session ("fam") : tous les jetons qui en descendent la portent, révoquer la session les invalide.
+# Un jeton de rafraîchissement déjà utilisé qui revient signale un vol : la session est révoquée.
+import uuid
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, status
+from jose import JWTError, jwt
+
+from app.database import db
+from app.revocation import revocation_list
+from app.utils import ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY, create_access_token, is_account_active
+
+REFRESH_TOKEN_EXPIRE_DAYS = 14
+REFRESH_TOKEN_LIFETIME = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+_invalid_refresh = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Jeton de rafraîchissement invalide",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+
+async def _issue(user_id: str, family: str) -> dict:
+    now = datetime.utcnow()
+    jti = uuid.uuid4().hex
+    expires_at = now + REFRESH_TOKEN_LIFETIME
+    await db.refresh_tokens.insert_one({
+        "jti": jti,
+        "family": family,
+        "user_id": user_id,
+        "created_at": now,
+        "expires_at": expires_at,
+        "used_at": None,
+    })
+    refresh_token = jwt.encode(
+        {"sub": user_id, "jti": jti, "fam": family, "type": "refresh", "iat": now, "exp": expires_at},
+        SECRET_KEY, algorithm=ALGORITHM
+    )
+    return {
+        "access_token": create_access_token({"sub": user_id, "fam": family}),
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+async def open_session(user_id: str) -> dict:
+    return await _issue(user_id, uuid.uuid4().hex)
+
+
+def _decode_refresh(token: str) -> dict:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise _invalid_refresh
+    if payload.get("type") != "refresh" or not payload.get("jti") or not payload.get("sub"):
+        raise _invalid_refresh
+    return payload
+
+
+async def rotate_refresh_token(token: str) -> dict:
+    payload = _decode_refresh(token)
+    if revocation_list.is_revoked(payload["jti"], payload.get("fam")):
+        raise _invalid_refresh
+    # Consommation atomique : deux rafraîchissements concurrents ne peuvent pas réussir tous les deux
+    consumed = await db.refresh_tokens.find_one_and_update(
+        {"jti": payload["jti"], "used_at": None},
+        {"$set": {"used_at": datetime.utcnow()}},
+        projection={"_id": 0, "family": 1, "user_id": 1}
+    )
+    if consumed is None:
+        await revoke_sessions([payload.get("fam")], reason="refresh_reuse")
+        raise _invalid_refresh
+    user = await db.users.find_one({"id": consumed["user_id"]}, {"_id": 0, "id": 1, "is_verified": 1})
+    if not user or not is_account_active(user):
+        raise _invalid_refresh
+    return await _issue(consumed["user_id"], consumed["family"])
+
+
+async def revoke_sessions(families: Iterable[Optional[str]], reason: str = ""):
+    # Les jetons d'une session expirent au plus tard avec son dernier jeton de rafraîchissement
+    families = [family for family in families if family]
+    await revocation_list.revoke(families, datetime.utcnow() + REFRESH_TOKEN_LIFETIME, reason)
+
+
+async def revoke_refresh_token(token: str):
+    payload = _decode_refresh(token)
+    await revoke_sessions([payload.get("fam")], reason="logout")
+
+
+async def revoke_user_sessions(user_id: str, reason: str = ""):
+    families = await db.refresh_tokens.distinct("family", {"user_id": user_id, "expires_at": {"$gt": datetime.utcnow()}})
+    await revoke_sessions(families, reason)
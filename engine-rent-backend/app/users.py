@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from app.database import db  # db = instance Motor async
+from app.pagination import PageParams, page_params, fetch_page, stream_ndjson
 from app.schemas import User, UserUpdate  # modèles Pydantic adaptés
 from app.dependencies import get_current_active_user
 from app.auth import require_roles
+from app.cache import invalidate_user
+from app.tokens import revoke_user_sessions
 from bson import ObjectId
 
 router = APIRouter(
@@ -12,13 +15,11 @@ router = APIRouter(
 
 # Voir tous les utilisateurs (Admin uniquement)
 @router.get("/", dependencies=[Depends(require_roles(["admin"]))])
-async def get_all_users():
-    users_cursor = db.users.find()
-    users = await users_cursor.to_list(length=1000)
-    # Si besoin, on peut convertir les _id en str
-    for user in users:
-        user["_id"] = str(user["_id"])
-    return users
+async def get_all_users(response: Response, page: PageParams = Depends(page_params(default_limit=1000))):
+    # Les _id sont convertis en str par la pagination
+    if page.stream:
+        return stream_ndjson(db.users, {}, page)
+    return await fetch_page(db.users, {}, page, response)
 
 # Voir son propre profil (tous les rôles)
 @router.get("/me")
@@ -41,6 +42,7 @@ async def update_my_profile(
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=400, detail="Mise à jour échouée")
+    invalidate_user(current_user.id)
 
     # Retourner le profil mis à jour
     updated_user = await db.users.find_one({"_id": ObjectId(current_user.id)})
@@ -53,8 +55,11 @@ async def delete_user(user_id: str):
     if not ObjectId.is_valid(user_id):
         raise HTTPException(status_code=400, detail="ID utilisateur invalide")
     
-    result = await db.users.delete_one({"_id": ObjectId(user_id)})
-    if result.deleted_count == 0:
+    deleted = await db.users.find_one_and_delete({"_id": ObjectId(user_id)}, projection={"id": 1})
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+    invalidate_user(deleted.get("id"))
+    if deleted.get("id"):
+        await revoke_user_sessions(deleted["id"], reason="deleted")
 
     return {"message": "Utilisateur supprimé"}
@@ -1,5 +1,7 @@
 # app/utils.py
 
+import os
+import uuid
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from passlib.context import CryptContext
@@ -9,14 +11,23 @@ from typing import Optional
 
 from app.models import User
 from app.database import db
+from app.cache import user_cache
+from app.revocation import revocation_list
 
 # Configuration JWT
 SECRET_KEY = "your-secret-key"  # 🔒 change ce secret en production
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60
-
-# Pour le hashage des mots de passe
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+ACCESS_TOKEN_EXPIRE_MINUTES = 15  # courts : la session se prolonge par /refresh
+
+# Pour le hashage des mots de passe : un hash d'un autre coût est refait à la connexion suivante
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 security = HTTPBearer()
 
 
@@ -30,10 +41,15 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def is_account_active(user: dict) -> bool:
+    # is_verified = compte activé par un admin ("Activer / Désactiver") ; absent = ancien compte actif.
+    # Seule règle d'accès au compte : appliquée à la connexion, au rafraîchissement et à chaque requête
+    return user.get("is_verified") is not False
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex, "type": "access"})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
@@ -45,15 +61,24 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     try:
         payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
-        if user_id is None:
+        if user_id is None or payload.get("type") == "refresh":
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-
-    user_data = await db.users.find_one({"id": user_id})
-    if user_data is None:
+    # Révocation (jeton ou session entière) : test en mémoire, sans requête MongoDB
+    if revocation_list.is_revoked(payload.get("jti"), payload.get("fam")):
         raise credentials_exception
-    return User(**user_data)
+
+    user = user_cache.get(user_id)
+    if user is None:
+        generation = user_cache.generation
+        user_data = await db.users.find_one({"id": user_id})
+        if user_data is None or not is_account_active(user_data):
+            raise credentials_exception
+        user = User(**user_data)
+        user_cache.set(user_id, user, generation)
+    # Copie : une route qui modifie current_user ne doit pas altérer l'entrée en cache
+    return user.model_copy()
 
 
 # -------------------------------------
@@ -0,0 +1,96 @@
+import asyncio
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import zipfile
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "engine-rent-backend"))
+
+from app import invoices  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = list(docs)
+
+    def sort(self, keys):
+        for key, direction in reversed(keys):
+            self.docs.sort(key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+    async def to_list(self, length):
+        batch, self.docs = self.docs[:length], self.docs[length:]
+        return batch
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = 0
+
+    def find(self, query, projection=None):
+        self.queries += 1
+        if "id" in query:
+            ids = set(query["id"]["$in"])
+            return FakeCursor(doc for doc in self.docs if doc["id"] in ids)
+        return FakeCursor(self.docs)
+
+
+# Documents tels qu'écrits par l'application : la réservation ne porte que engine_id
+def engine(i):
+    return {"id": f"e{i}", "name": f"Pelleteuse {i}", "category": "terrassement", "daily_rate": 150000}
+
+
+def reservation(i):
+    return {
+        "id": f"r{i}", "user_id": f"u{i % 2}", "engine_id": f"e{i % 3}", "status": "paid",
+        "start_date": datetime(2024, 5, 1), "end_date": datetime(2024, 5, 4), "total_price": 450000,
+    }
+
+
+def payment(i):
+    return {
+        "id": f"p{i}", "reservation_id": f"r{i}", "user_id": f"u{i % 2}", "amount": 450000,
+        "method": "mvola", "status": "completed", "created_at": datetime(2024, 5, 1, 10, i),
+    }
+
+
+class InvoiceExportTest(unittest.TestCase):
+    def setUp(self):
+        self.engines = FakeCollection([engine(i) for i in range(3)])
+        self.saved = invoices.db, invoices.INVOICE_CACHE_DIR
+        invoices.db = SimpleNamespace(
+            payments=FakeCollection([payment(i) for i in range(5)]),
+            reservations=FakeCollection([reservation(i) for i in range(5)]),
+            users=FakeCollection([{"id": f"u{i}", "name": f"Client {i}", "email": f"client{i}@test.com"} for i in range(2)]),
+            engines=self.engines,
+        )
+        invoices.INVOICE_CACHE_DIR = tempfile.mkdtemp()
+
+    def tearDown(self):
+        invoices.shutdown_pool()
+        shutil.rmtree(invoices.INVOICE_CACHE_DIR, ignore_errors=True)
+        invoices.db, invoices.INVOICE_CACHE_DIR = self.saved
+
+    async def collect(self):
+        return b"".join([chunk async for chunk in invoices.export_invoices_zip({})])
+
+    def test_documents_use_engine_names_loaded_in_one_query(self):
+        documents = asyncio.run(invoices._batch_documents([payment(i) for i in range(5)]))
+        self.assertEqual([d["reservation"] for d in documents], [f"Pelleteuse {i % 3}" for i in range(5)])
+        self.assertEqual(documents[1]["client"], "Client 1 (client1@test.com)")
+        self.assertEqual(self.engines.queries, 1)
+
+    def test_archive_contains_one_invoice_per_payment(self):
+        archive = zipfile.ZipFile(io.BytesIO(asyncio.run(self.collect())))
+        self.assertEqual(sorted(archive.namelist()), [f"facture_p{i}.pdf" for i in range(5)])
+        self.assertTrue(archive.read("facture_p0.pdf").startswith(b"%PDF"))
+
+
+if __name__ == "__main__":
+    unittest.main()
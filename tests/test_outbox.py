@@ -0,0 +1,113 @@
+import asyncio
+import os
+import socket
+import sys
+import time
+import unittest
+from types import SimpleNamespace
+
+from aiosmtpd.controller import Controller
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "engine-rent-backend"))
+
+from app import outbox  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class RecordingHandler:
+    def __init__(self, refused=(), delay=0.0):
+        self.refused = set(refused)
+        self.delay = delay
+        self.received = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.refused:
+            return "550 Destinataire inconnu"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received.append((envelope.rcpt_tos[0], envelope.content.decode()))
+        return "250 Message accepted"
+
+
+class RecordingOutbox:
+    def __init__(self):
+        self.lease_renewals = 0
+        self.final_updates = []
+
+    async def update_many(self, query, update):
+        self.lease_renewals += 1
+
+    async def bulk_write(self, requests, ordered=True):
+        self.final_updates.extend(requests)
+
+
+def message(i, to=None):
+    return {"id": f"m{i}", "to": to or f"client{i}@test.com", "subject": f"Sujet {i}", "body": "Bonjour", "attempts": 0, "claim": "c1"}
+
+
+class OutboxSmtpTest(unittest.TestCase):
+    def start_server(self, handler):
+        port = free_port()
+        controller = Controller(handler, hostname="127.0.0.1", port=port)
+        controller.start()
+        self.addCleanup(controller.stop)
+        self._settings = (outbox.SMTP_HOST, outbox.SMTP_PORT)
+        outbox.SMTP_HOST, outbox.SMTP_PORT = "127.0.0.1", port
+        self.addCleanup(self.restore_settings)
+
+    def restore_settings(self):
+        outbox.SMTP_HOST, outbox.SMTP_PORT = self._settings
+
+    def test_batch_is_delivered_on_one_connection(self):
+        handler = RecordingHandler()
+        self.start_server(handler)
+        results = outbox._deliver([message(i) for i in range(3)])
+        self.assertEqual(results, {"m0": None, "m1": None, "m2": None})
+        self.assertEqual([to for to, _ in handler.received], [f"client{i}@test.com" for i in range(3)])
+        self.assertIn("Subject: Sujet 1", handler.received[1][1])
+
+    def test_refused_recipient_only_fails_its_message(self):
+        handler = RecordingHandler(refused={"inconnu@test.com"})
+        self.start_server(handler)
+        results = outbox._deliver([message(0), message(1, to="inconnu@test.com"), message(2)])
+        self.assertIsNone(results["m0"])
+        self.assertIsNone(results["m2"])
+        self.assertIn("Destinataire refusé", results["m1"])
+        self.assertEqual(len(handler.received), 2)
+
+    def test_unreachable_server_fails_whole_batch(self):
+        self._settings = (outbox.SMTP_HOST, outbox.SMTP_PORT)
+        outbox.SMTP_HOST, outbox.SMTP_PORT = "127.0.0.1", free_port()
+        self.addCleanup(self.restore_settings)
+        results = outbox._deliver([message(0), message(1)])
+        self.assertTrue(all(error.startswith("Connexion SMTP") for error in results.values()))
+
+    def test_lease_is_renewed_while_batch_is_sending(self):
+        handler = RecordingHandler(delay=0.1)
+        self.start_server(handler)
+        collection = RecordingOutbox()
+        saved = outbox.db, outbox.LEASE_RENEW_SECONDS
+        outbox.db, outbox.LEASE_RENEW_SECONDS = SimpleNamespace(email_outbox=collection), 0.05
+        try:
+            started = time.perf_counter()
+            asyncio.run(outbox._send_batch([message(i) for i in range(3)]))
+            elapsed = time.perf_counter() - started
+        finally:
+            outbox.db, outbox.LEASE_RENEW_SECONDS = saved
+        self.assertGreaterEqual(elapsed, 0.3)
+        self.assertGreaterEqual(collection.lease_renewals, 2)
+        self.assertEqual(len(collection.final_updates), 3)
+        self.assertEqual(len(handler.received), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import sys
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "engine-rent-backend"))
+
+from app import loaders  # noqa: E402
+
+
+class CountingCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class CountingCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = 0
+
+    def find(self, query, projection=None):
+        self.queries += 1
+        ids = set(query["id"]["$in"])
+        return CountingCursor([doc for doc in self.docs if doc["id"] in ids])
+
+    def find_one(self, query, projection=None):
+        raise AssertionError("find_one ne doit plus être appelé par ligne")
+
+
+class PaymentEnrichmentTest(unittest.TestCase):
+    def setUp(self):
+        self.users = CountingCollection([{"id": f"u{i}", "email": f"u{i}@test.com"} for i in range(50)])
+        self.reservations = CountingCollection([
+            {"id": f"r{i}", "user_id": f"u{i % 50}", "engine_name": f"Engin {i}"} for i in range(1000)
+        ])
+        self._db = loaders.db
+        loaders.db = SimpleNamespace(users=self.users, reservations=self.reservations)
+        self.admin = SimpleNamespace(role="admin", email="admin@test.com")
+
+    def tearDown(self):
+        loaders.db = self._db
+
+    def payments(self, count):
+        return [
+            {
+                "id": f"p{i}",
+                "reservation_id": f"r{i}",
+                "amount": 100.0,
+                "status": "pending",
+                "payment_method": "stripe",
+                "created_at": datetime(2024, 1, 1),
+            }
+            for i in range(count)
+        ]
+
+    def test_query_count_is_constant(self):
+        for count in (1, 10, 1000):
+            self.users.queries = self.reservations.queries = 0
+            enriched = asyncio.run(loaders.enrich_payments(self.payments(count), self.admin))
+            self.assertEqual(len(enriched), count)
+            self.assertEqual(self.reservations.queries, 1)
+            self.assertEqual(self.users.queries, 1)
+
+    def test_enrichment_falls_back_to_reservation_user(self):
+        payments = self.payments(2) + [{**self.payments(1)[0], "id": "p-missing", "reservation_id": "r-missing"}]
+        enriched = asyncio.run(loaders.enrich_payments(payments, self.admin))
+        self.assertEqual(enriched[1].user_email, "u1@test.com")
+        self.assertEqual(enriched[1].reservation_title, "Engin 1")
+        self.assertEqual(enriched[2].user_email, "Inconnu")
+        self.assertEqual(enriched[2].reservation_title, "Réservation")
+
+
+if __name__ == "__main__":
+    unittest.main()